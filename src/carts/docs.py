@@ -4,7 +4,9 @@ from .serializers import CartSerializer, CartItemSerializer
 cart_list_summary = "Get user cart"
 cart_list_description = (
     "Return the authenticated user's cart including nested items and product info. "
-    "If the user has no cart, it will be empty or created when the first item is added."
+    "If the user has no cart, it will be empty or created when the first item is added.\n\n"
+    "When a hot cart store is configured (`CART_STORE_BACKEND`), the cart is served from it and "
+    "written back to the database in the background and at checkout."
 )
 cart_list_responses = {
     200: openapi.Response("User cart", CartSerializer()),
@@ -13,8 +15,9 @@ cart_list_responses = {
 
 cart_retrieve_summary = "Retrieve user cart"
 cart_retrieve_description = (
-    "Retrieve the authenticated user's cart including nested items, product details, "
-    "totals, and quantities."
+    "Retrieve the authenticated user's cart. Each line carries the product id, title, unit price, "
+    "discount, effective price, quantity, line total and primary image; `totals` holds the item and "
+    "unit counts, subtotal, discount and total computed by the server."
 )
 cart_retrieve_responses = {
     200: openapi.Response("User cart", CartSerializer()),
@@ -59,6 +62,29 @@ cart_item_update_responses = {
     401: openapi.Response("Authentication credentials were not provided."),
 }
 
+cart_items_replace_summary = "Replace the cart's items"
+cart_items_replace_description = (
+    "Sync the authenticated user's cart in one request: the body is the full list of lines, "
+    "`[{\"product_id\": \"<uuid>\", \"quantity\": n}, ...]`. Lines not in the list (or with quantity 0) "
+    "are removed, the rest are created or updated in one transaction. Returns the cart."
+)
+cart_items_replace_request = openapi.Schema(
+    type=openapi.TYPE_ARRAY,
+    items=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=["product_id", "quantity"],
+        properties={
+            "product_id": openapi.Schema(type=openapi.TYPE_STRING, format="uuid"),
+            "quantity": openapi.Schema(type=openapi.TYPE_INTEGER, description="Units wanted (>=0)"),
+        },
+    ),
+)
+cart_items_replace_responses = {
+    200: openapi.Response("Updated cart", CartSerializer()),
+    400: openapi.Response("Validation error, e.g. unknown product or not enough stock"),
+    401: openapi.Response("Authentication credentials were not provided."),
+}
+
 cart_examples = {
     "add_example": {
         "summary": "Add 2 units of a product",
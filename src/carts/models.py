@@ -12,6 +12,13 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart ({self.user.email})"
 
+    @property
+    def lines(self):
+        """Items to render: pre-built for carts served from the hot cart store, else the related items."""
+        if hasattr(self, "store_items"):
+            return self.store_items
+        return self.items.all()
+
 
 class CartItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
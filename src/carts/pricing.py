@@ -0,0 +1,71 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+CENT = Decimal("0.01")
+
+
+def effective_price(price, discount_percent):
+    """Unit price after discount, rounded to the cent like effective_price_expression."""
+    return (price * (100 - discount_percent) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def effective_price_expression(prefix=""):
+    price, discount = F(f"{prefix}price"), F(f"{prefix}discount_percent")
+    return Round(price * (Value(100) - discount) / Value(100), 2, output_field=MONEY)
+
+
+def totals_annotations(prefix, quantity):
+    """
+    Aggregates for a set of cart lines: `prefix` leads from the rows to the
+    product and `quantity` is the expression for each line's quantity.
+    """
+    return {
+        "item_count": Count(f"{prefix}id"),
+        "units": Coalesce(Sum(quantity), 0),
+        "subtotal": Coalesce(Sum(F(f"{prefix}price") * quantity, output_field=MONEY), Value(0), output_field=MONEY),
+        "total": Coalesce(Sum(effective_price_expression(prefix) * quantity, output_field=MONEY), Value(0), output_field=MONEY),
+    }
+
+
+def cart_totals_annotations():
+    """Per-cart totals for annotating a Cart queryset."""
+    return totals_annotations("items__product__", F("items__quantity"))
+
+
+def format_totals(values):
+    subtotal, total = values["subtotal"], values["total"]
+    return {
+        "item_count": values["item_count"],
+        "units": values["units"],
+        "subtotal": subtotal,
+        "discount": subtotal - total,
+        "total": total,
+    }
+
+
+def cart_totals(cart):
+    """
+    Totals for a cart, from the Cart queryset annotations when present,
+    otherwise in one aggregate query (over the products, for carts built
+    from the hot cart store).
+    """
+    from products.models import Product
+    from .models import CartItem
+
+    if hasattr(cart, "store_items"):
+        quantities = {item.product_id: item.quantity for item in cart.store_items}
+        quantity = Case(
+            *[When(id=product_id, then=Value(qty)) for product_id, qty in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        values = Product.objects.filter(id__in=list(quantities)).aggregate(**totals_annotations("", quantity))
+    elif hasattr(cart, "subtotal"):
+        values = {key: getattr(cart, key) for key in ("item_count", "units", "subtotal", "total")}
+    else:
+        values = CartItem.objects.filter(cart_id=cart.pk).aggregate(
+            **totals_annotations("product__", F("quantity"))
+        )
+    return format_totals(values)
@@ -1,7 +1,10 @@
 from rest_framework import serializers
+from utils.fieldsets import SparseFieldsetsMixin
 from products.serializers import ProductSerializer
 from products.models import Product
+from products.reservations import available_to
 from .models import Cart, CartItem
+from .pricing import cart_totals, effective_price
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -12,8 +15,12 @@ class CartItemSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "product", "created_at"]
 
     def validate(self, data):
+        quantity = data.get("quantity", 1)
         if self.instance:
             product = self.instance.product
+            # the new quantity replaces the cart owner's current hold
+            if available_to(self.instance.cart.user_id, [product])[product.pk] < quantity:
+                raise serializers.ValidationError({"quantity": "Not enough stock available."})
         else:
             product_id = data.get("product_id")
             if not product_id:
@@ -22,18 +29,79 @@ class CartItemSerializer(serializers.ModelSerializer):
                 product = Product.objects.get(pk=product_id)
             except Product.DoesNotExist:
                 raise serializers.ValidationError({"product_id": "Product does not exist."})
-        
-        quantity = data.get("quantity", 1)
-        if hasattr(product, "stock") and product.stock < quantity:
-            raise serializers.ValidationError({"quantity": "Not enough stock available."})
-        
+            # the added units come on top of the user's current hold
+            if product.available < quantity:
+                raise serializers.ValidationError({"quantity": "Not enough stock available."})
+
         data['product_obj'] = product 
         return data
 
-class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+class CartLineSerializer(serializers.ModelSerializer):
+    """Compact cart line: just what a cart view needs to render and price it."""
+    product_id = serializers.UUIDField(read_only=True)
+    title = serializers.CharField(source="product.title", read_only=True)
+    unit_price = serializers.DecimalField(source="product.price", max_digits=10, decimal_places=2, read_only=True)
+    discount_percent = serializers.DecimalField(
+        source="product.discount_percent", max_digits=5, decimal_places=2, read_only=True
+    )
+    effective_price = serializers.SerializerMethodField()
+    line_total = serializers.SerializerMethodField()
+    primary_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartItem
+        fields = [
+            "id", "product_id", "title", "unit_price", "discount_percent", "effective_price",
+            "quantity", "line_total", "primary_image", "created_at",
+        ]
+        read_only_fields = fields
+
+    def get_effective_price(self, obj):
+        return str(effective_price(obj.product.price, obj.product.discount_percent))
+
+    def get_line_total(self, obj):
+        return str(effective_price(obj.product.price, obj.product.discount_percent) * obj.quantity)
+
+    def get_primary_image(self, obj):
+        return obj.product.primary_image_url or None
+
+
+class CartTotalsSerializer(serializers.Serializer):
+    item_count = serializers.IntegerField()
+    units = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """
+    Lean cart read model. `totals` comes from one aggregate query (or the
+    queryset annotations added by CartViewSet), never from summing lines
+    in Python.
+    """
+    items = CartLineSerializer(many=True, read_only=True, source="lines")
+    totals = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ["id", "items", "created_at"]
-        read_only_fields = ["id", "created_at"]
\ No newline at end of file
+        fields = ["id", "items", "totals", "created_at"]
+        read_only_fields = ["id", "created_at"]
+
+    def get_totals(self, obj):
+        return CartTotalsSerializer(cart_totals(obj)).data
+
+class CartLineInputSerializer(serializers.Serializer):
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class CartItemsReplaceSerializer(serializers.ListSerializer):
+    """The full set of cart lines for `PUT /carts/me/items/`; quantity 0 removes a line."""
+    child = CartLineInputSerializer()
+
+    def validate(self, attrs):
+        product_ids = [line["product_id"] for line in attrs]
+        if len(product_ids) != len(set(product_ids)):
+            raise serializers.ValidationError("Each product may appear only once.")
+        return attrs
@@ -0,0 +1,339 @@
+import abc
+import json
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class CartLine:
+    """One product line of a hot cart; `id` becomes the CartItem primary key."""
+
+    def __init__(self, id, product_id, quantity, created_at):
+        self.id = id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.created_at = created_at
+
+
+class CartSnapshot:
+    def __init__(self, cart_id, lines=None):
+        self.cart_id = cart_id
+        self.lines = lines or {}  # product id (str) -> CartLine
+
+    def line_by_id(self, item_id):
+        return next((line for line in self.lines.values() if line.id == str(item_id)), None)
+
+
+class CartStore(abc.ABC):
+    """
+    Interface of a hot cart store: active carts keyed by user id, each a map
+    of product id -> quantity. Writes mark the cart dirty; carts.sync
+    persists dirty carts to Cart/CartItem.
+
+    Line writes take `seed`, a callable returning the cart's CartSnapshot
+    from the database. It is only called when the cart isn't in the store
+    (never loaded, or expired since it was read), and the store installs it
+    in the same atomic step as the write so the write can't be lost.
+    """
+
+    @abc.abstractmethod
+    def get(self, user_id):
+        """The user's CartSnapshot, or None if the cart isn't in the store."""
+
+    @abc.abstractmethod
+    def seed(self, user_id, snapshot):
+        """Store `snapshot` unless the user already has a cart; returns the stored one."""
+
+    @abc.abstractmethod
+    def replace(self, user_id, snapshot):
+        """Overwrite the user's cart and mark it dirty."""
+
+    @abc.abstractmethod
+    def add(self, user_id, product_id, quantity, seed):
+        """Atomically add `quantity` (may be negative) to a line; returns the CartLine."""
+
+    @abc.abstractmethod
+    def set_quantity(self, user_id, product_id, quantity, seed):
+        pass
+
+    @abc.abstractmethod
+    def remove(self, user_id, product_id, seed):
+        pass
+
+    @abc.abstractmethod
+    def set_cart_id(self, user_id, cart_id):
+        pass
+
+    @abc.abstractmethod
+    def discard(self, user_id):
+        """Drop the user's cart from the store without persisting it."""
+
+    @abc.abstractmethod
+    def claim_dirty(self, limit=500):
+        """Pop up to `limit` user ids whose carts changed since they were last persisted."""
+
+    @abc.abstractmethod
+    def mark_dirty(self, user_id):
+        pass
+
+
+def new_line(product_id, quantity=0):
+    return CartLine(str(uuid.uuid4()), str(product_id), quantity, time.time())
+
+
+class InMemoryCartStore(CartStore):
+    """Process-local store for tests and single-process development."""
+
+    def __init__(self, **options):
+        self.carts = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+
+    def _copy(self, snapshot):
+        lines = {
+            pid: CartLine(line.id, line.product_id, line.quantity, line.created_at)
+            for pid, line in snapshot.lines.items()
+        }
+        return CartSnapshot(snapshot.cart_id, lines)
+
+    def get(self, user_id):
+        with self.lock:
+            snapshot = self.carts.get(user_id)
+            return self._copy(snapshot) if snapshot else None
+
+    def seed(self, user_id, snapshot):
+        with self.lock:
+            self.carts.setdefault(user_id, self._copy(snapshot))
+            return self._copy(self.carts[user_id])
+
+    def replace(self, user_id, snapshot):
+        with self.lock:
+            self.carts[user_id] = self._copy(snapshot)
+            self.dirty.add(user_id)
+
+    def _lines(self, user_id, seed):
+        # called with the lock held, so seeding and the write are one step
+        if user_id not in self.carts:
+            self.carts[user_id] = self._copy(seed())
+        return self.carts[user_id].lines
+
+    def add(self, user_id, product_id, quantity, seed):
+        with self.lock:
+            lines = self._lines(user_id, seed)
+            line = lines.setdefault(str(product_id), new_line(product_id))
+            line.quantity += quantity
+            self.dirty.add(user_id)
+            return CartLine(line.id, line.product_id, line.quantity, line.created_at)
+
+    def set_quantity(self, user_id, product_id, quantity, seed):
+        with self.lock:
+            line = self._lines(user_id, seed).setdefault(str(product_id), new_line(product_id))
+            line.quantity = quantity
+            self.dirty.add(user_id)
+
+    def remove(self, user_id, product_id, seed):
+        with self.lock:
+            self._lines(user_id, seed).pop(str(product_id), None)
+            self.dirty.add(user_id)
+
+    def set_cart_id(self, user_id, cart_id):
+        with self.lock:
+            if user_id in self.carts:
+                self.carts[user_id].cart_id = str(cart_id)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.carts.pop(user_id, None)
+            self.dirty.discard(user_id)
+
+    def claim_dirty(self, limit=500):
+        with self.lock:
+            claimed = list(self.dirty)[:limit]
+            self.dirty.difference_update(claimed)
+            return claimed
+
+    def mark_dirty(self, user_id):
+        with self.lock:
+            self.dirty.add(user_id)
+
+
+class RedisCartStore(CartStore):
+    """
+    Carts as Redis hashes: `cart:<user>` maps product id -> quantity and
+    `cart:<user>:meta` holds the cart id and each line's item id and creation
+    time. Line writes run as one Lua script (WRITE_SCRIPT) that also seeds an
+    expired cart. Both expire CART_STORE_TTL seconds after the
+    last write; dirty user ids live in the `carts:dirty` set.
+    """
+    DIRTY_KEY = "carts:dirty"
+    CART_ID_FIELD = "_cart"
+
+    def __init__(self, url=None, ttl=None, prefix="prodev"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+        self.ttl = ttl or settings.CART_STORE_TTL
+        self.prefix = prefix
+        self._write_script = self.redis.register_script(self.WRITE_SCRIPT)
+
+    def _keys(self, user_id):
+        key = f"{self.prefix}:cart:{user_id}"
+        return key, f"{key}:meta"
+
+    @staticmethod
+    def _member(user_id):
+        # redis-py only packs str/bytes/numbers, and User.id is a UUID
+        return str(user_id)
+
+    @staticmethod
+    def _user_id(member):
+        try:
+            return uuid.UUID(member)
+        except ValueError:
+            return int(member) if member.isdigit() else member
+
+    def get(self, user_id):
+        qty_key, meta_key = self._keys(user_id)
+        with self.redis.pipeline() as pipe:
+            quantities, meta = pipe.hgetall(qty_key).hgetall(meta_key).execute()
+        if self.CART_ID_FIELD not in meta:
+            return None
+        lines = {}
+        for product_id, quantity in quantities.items():
+            item_id, _, created_at = meta.get(product_id, "").partition(" ")
+            if item_id:
+                lines[product_id] = CartLine(item_id, product_id, int(quantity), float(created_at))
+        return CartSnapshot(meta[self.CART_ID_FIELD], lines)
+
+    def _write(self, pipe, user_id, snapshot):
+        qty_key, meta_key = self._keys(user_id)
+        pipe.delete(qty_key, meta_key)
+        pipe.hset(meta_key, self.CART_ID_FIELD, str(snapshot.cart_id))
+        for product_id, line in snapshot.lines.items():
+            pipe.hset(qty_key, product_id, line.quantity)
+            pipe.hset(meta_key, product_id, f"{line.id} {line.created_at}")
+        for key in (qty_key, meta_key):
+            pipe.expire(key, self.ttl)
+
+    def seed(self, user_id, snapshot):
+        _, meta_key = self._keys(user_id)
+        if self.redis.hsetnx(meta_key, self.CART_ID_FIELD, str(snapshot.cart_id)):
+            with self.redis.pipeline() as pipe:
+                self._write(pipe, user_id, snapshot)
+                pipe.execute()
+        return self.get(user_id)
+
+    def replace(self, user_id, snapshot):
+        with self.redis.pipeline() as pipe:
+            self._write(pipe, user_id, snapshot)
+            pipe.sadd(f"{self.prefix}:{self.DIRTY_KEY}", self._member(user_id))
+            pipe.execute()
+
+    # Seeds the cart from ARGV[6] (JSON, see _encode_seed) when its meta hash
+    # is gone, then applies one line write, all in one atomic step. Returns
+    # false without writing when the cart is missing and no seed was sent.
+    WRITE_SCRIPT = """
+    local qty_key, meta_key, dirty_key = KEYS[1], KEYS[2], KEYS[3]
+    local op, product_id, value, line_meta, seed = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[6]
+    if redis.call('HEXISTS', meta_key, ARGV[7]) == 0 then
+        if seed == '' then
+            return false
+        end
+        seed = cjson.decode(seed)
+        redis.call('DEL', qty_key, meta_key)
+        redis.call('HSET', meta_key, ARGV[7], seed['cart'])
+        for pid, line in pairs(seed['lines']) do
+            redis.call('HSET', qty_key, pid, line[1])
+            redis.call('HSET', meta_key, pid, line[2])
+        end
+    end
+    if op == 'remove' then
+        redis.call('HDEL', qty_key, product_id)
+        redis.call('HDEL', meta_key, product_id)
+    else
+        redis.call('HSETNX', meta_key, product_id, line_meta)
+        if op == 'add' then
+            redis.call('HINCRBY', qty_key, product_id, value)
+        else
+            redis.call('HSET', qty_key, product_id, value)
+        end
+    end
+    redis.call('EXPIRE', qty_key, ARGV[5])
+    redis.call('EXPIRE', meta_key, ARGV[5])
+    redis.call('SADD', dirty_key, ARGV[8])
+    return {redis.call('HGET', qty_key, product_id), redis.call('HGET', meta_key, product_id)}
+    """
+
+    def _encode_seed(self, snapshot):
+        return json.dumps({
+            "cart": str(snapshot.cart_id),
+            "lines": {pid: [line.quantity, f"{line.id} {line.created_at}"] for pid, line in snapshot.lines.items()},
+        })
+
+    def _write_line(self, user_id, op, product_id, value, seed):
+        qty_key, meta_key = self._keys(user_id)
+        product_id = str(product_id)
+        line = new_line(product_id)
+        keys = [qty_key, meta_key, f"{self.prefix}:{self.DIRTY_KEY}"]
+        args = [op, product_id, value, f"{line.id} {line.created_at}", self.ttl, "", self.CART_ID_FIELD,
+                self._member(user_id)]
+        result = self._write_script(keys=keys, args=args)
+        if result is None:
+            args[5] = self._encode_seed(seed())
+            result = self._write_script(keys=keys, args=args)
+        return result
+
+    def add(self, user_id, product_id, quantity, seed):
+        total, meta = self._write_line(user_id, "add", product_id, quantity, seed)
+        item_id, _, created_at = meta.partition(" ")
+        return CartLine(item_id, str(product_id), int(total), float(created_at))
+
+    def set_quantity(self, user_id, product_id, quantity, seed):
+        self._write_line(user_id, "set", product_id, quantity, seed)
+
+    def remove(self, user_id, product_id, seed):
+        self._write_line(user_id, "remove", product_id, 0, seed)
+
+    def set_cart_id(self, user_id, cart_id):
+        _, meta_key = self._keys(user_id)
+        if self.redis.exists(meta_key):
+            self.redis.hset(meta_key, self.CART_ID_FIELD, str(cart_id))
+
+    def discard(self, user_id):
+        with self.redis.pipeline() as pipe:
+            pipe.delete(*self._keys(user_id))
+            pipe.srem(f"{self.prefix}:{self.DIRTY_KEY}", self._member(user_id))
+            pipe.execute()
+
+    def claim_dirty(self, limit=500):
+        return [self._user_id(member)
+                for member in self.redis.spop(f"{self.prefix}:{self.DIRTY_KEY}", limit) or []]
+
+    def mark_dirty(self, user_id):
+        self.redis.sadd(f"{self.prefix}:{self.DIRTY_KEY}", self._member(user_id))
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_cart_store():
+    """The configured CART_STORE_BACKEND instance, or None when carts live only in the database."""
+    global _store
+    if not settings.CART_STORE_BACKEND:
+        return None
+    with _lock:
+        if _store is None:
+            _store = import_string(settings.CART_STORE_BACKEND)(**settings.CART_STORE_OPTIONS)
+        return _store
+
+
+@receiver(setting_changed)
+def reset_cart_store(setting, **kwargs):
+    global _store
+    if setting in ("CART_STORE_BACKEND", "CART_STORE_OPTIONS"):
+        _store = None
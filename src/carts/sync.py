@@ -0,0 +1,84 @@
+import datetime
+import uuid
+from django.db import transaction
+from products.models import Product
+from .models import Cart, CartItem
+from .stores import CartLine, CartSnapshot
+
+
+def snapshot_from_db(user_id):
+    """The user's persisted cart as a CartSnapshot (with a fresh cart id if there is none)."""
+    cart = Cart.objects.filter(user_id=user_id).only("id").first()
+    if cart is None:
+        return CartSnapshot(str(uuid.uuid4()))
+    lines = {
+        str(product_id): CartLine(str(item_id), str(product_id), quantity, created_at.timestamp())
+        for item_id, product_id, quantity, created_at in
+        CartItem.objects.filter(cart=cart).values_list("id", "product_id", "quantity", "created_at")
+    }
+    return CartSnapshot(str(cart.pk), lines)
+
+
+def load_cart(store, user_id):
+    """The user's hot cart, seeding the store from the database on a miss."""
+    snapshot = store.get(user_id)
+    if snapshot is None:
+        snapshot = store.seed(user_id, snapshot_from_db(user_id))
+    return snapshot
+
+
+def build_cart(snapshot, user, prefetch=()):
+    """
+    An unsaved Cart with its CartItems built from a snapshot, for the cart
+    serializers. Products are fetched in one query (plus `prefetch`); lines
+    whose product is gone are skipped.
+    """
+    products = Product.objects.filter(id__in=list(snapshot.lines)).prefetch_related(*prefetch).in_bulk()
+    cart = Cart(id=snapshot.cart_id, user=user)
+    cart.store_items = [build_item(cart, line, products[uuid.UUID(line.product_id)])
+                        for line in sorted(snapshot.lines.values(), key=lambda line: -line.created_at)
+                        if uuid.UUID(line.product_id) in products]
+    return cart
+
+
+def build_item(cart, line, product):
+    return CartItem(
+        id=line.id,
+        cart=cart,
+        product=product,
+        quantity=line.quantity,
+        created_at=datetime.datetime.fromtimestamp(line.created_at, tz=datetime.timezone.utc),
+    )
+
+
+def persist_cart(store, user_id):
+    """
+    Write the user's hot cart through to Cart/CartItem: upsert every line
+    under its store id and delete items no longer in the cart.
+    """
+    snapshot = store.get(user_id)
+    if snapshot is None:
+        return
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.select_for_update().get_or_create(user_id=user_id, defaults={"id": snapshot.cart_id})
+        if str(cart.pk) != snapshot.cart_id:
+            store.set_cart_id(user_id, cart.pk)
+
+        live = set(Product.objects.filter(id__in=list(snapshot.lines)).values_list("id", flat=True))
+        lines = {uuid.UUID(pid): line for pid, line in snapshot.lines.items()
+                 if uuid.UUID(pid) in live and line.quantity > 0}
+        existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+
+        CartItem.objects.filter(cart=cart).exclude(product_id__in=list(lines)).delete()
+        changed = []
+        for product_id, line in lines.items():
+            item = existing.get(product_id)
+            if item is not None and item.quantity != line.quantity:
+                item.quantity = line.quantity
+                changed.append(item)
+        CartItem.objects.bulk_update(changed, ["quantity"])
+        CartItem.objects.bulk_create([
+            CartItem(id=line.id, cart=cart, product_id=product_id, quantity=line.quantity)
+            for product_id, line in lines.items() if product_id not in existing
+        ])
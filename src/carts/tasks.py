@@ -0,0 +1,25 @@
+import logging
+from celery import shared_task
+from .stores import get_cart_store
+from .sync import persist_cart
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def persist_dirty_carts(limit=500):
+    """Write-behind for the hot cart store: persist carts changed since the last run."""
+    store = get_cart_store()
+    if store is None:
+        return "no_cart_store"
+
+    user_ids = store.claim_dirty(limit)
+    failed = 0
+    for user_id in user_ids:
+        try:
+            persist_cart(store, user_id)
+        except Exception:
+            failed += 1
+            logger.exception("Could not persist cart of user %s", user_id)
+            store.mark_dirty(user_id)
+    return f"{len(user_ids) - failed} carts persisted, {failed} failed"
@@ -1,14 +1,35 @@
-from uuid import uuid4
+import os
+from unittest import skipUnless
+from uuid import UUID, uuid4
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 
 from categories.models import Category
-from products.models import Product
+from products.models import Product, StockReservation
+from products.tasks import release_expired_reservations
 from carts.models import Cart, CartItem
+from carts.stores import CartStore, InMemoryCartStore, RedisCartStore, get_cart_store
+from carts.sync import snapshot_from_db
+from carts.tasks import persist_dirty_carts
+from django.utils import timezone
 
 User = get_user_model()
 
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+def redis_available():
+    import redis
+
+    try:
+        return redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=0.2).ping()
+    except redis.RedisError:
+        return False
+
 
 class CartAPITestCase(APITestCase):
     def setUp(self):
@@ -55,3 +76,170 @@ class CartAPITestCase(APITestCase):
         for it in resp.data.get("results", resp.data):
             if isinstance(it, dict):
                 self.assertNotEqual(it.get("product", {}).get("id"), str(self.p2.id))
+
+    @override_settings(CART_STORE_BACKEND="carts.stores.InMemoryCartStore")
+    def test_hot_cart_store_serves_writes_and_persists_behind(self):
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.p2, quantity=1)
+        self.client.force_authenticate(user=self.user)
+
+        resp = self.client.post("/api/cart-items/", {"product_id": str(self.p1.id), "quantity": 2}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        item_id = resp.data["id"]
+        resp = self.client.post("/api/cart-items/", {"product_id": str(self.p1.id), "quantity": 9}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.patch(f"/api/cart-items/{item_id}/", {"quantity": 3}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(CartItem.objects.filter(product=self.p1).count(), 0)
+
+        resp = self.client.get(self.list_url)
+        lines = {row["product_id"]: row["quantity"] for row in resp.data["results"][0]["items"]}
+        self.assertEqual(lines, {str(self.p1.id): 3, str(self.p2.id): 1})
+
+        persist_dirty_carts()
+        self.assertEqual(CartItem.objects.get(product=self.p1).pk, UUID(item_id))
+        self.assertEqual(CartItem.objects.get(product=self.p1).quantity, 3)
+
+        other_id = next(line.id for line in get_cart_store().get(self.user.pk).lines.values()
+                        if line.product_id == str(self.p2.id))
+        self.client.delete(f"/api/cart-items/{other_id}/")
+        persist_dirty_carts()
+        self.assertEqual(list(CartItem.objects.values_list("product_id", flat=True)), [self.p1.id])
+
+    def test_cart_store_writes_seed_an_expired_cart_in_the_same_step(self):
+        with self.assertRaises(TypeError):
+            type("PartialStore", (CartStore,), {"get": lambda self, user_id: None})()
+
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.p2, quantity=1)
+        store = InMemoryCartStore()
+        line = store.add(self.user.pk, self.p1.pk, 2, lambda: snapshot_from_db(self.user.pk))
+        self.assertEqual(line.quantity, 2)
+        lines = {pid: line.quantity for pid, line in store.get(self.user.pk).lines.items()}
+        self.assertEqual(lines, {str(self.p1.pk): 2, str(self.p2.pk): 1})
+
+    def test_replace_items_syncs_whole_cart(self):
+        p3 = Product.objects.create(title="Prod C", slug="prod-c", category=self.cat, price=10, stock=5)
+        cart = Cart.objects.create(user=self.user)
+        kept = CartItem.objects.create(cart=cart, product=self.p1, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.p2, quantity=1)
+        self.client.force_authenticate(user=self.user)
+        url = "/api/carts/me/items/"
+
+        resp = self.client.put(url, [{"product_id": str(self.p1.id), "quantity": 1},
+                                     {"product_id": str(self.p1.id), "quantity": 2}], format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.put(url, [{"product_id": str(p3.id), "quantity": 6}], format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(p3.id), resp.data["items"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.put(url, [
+                {"product_id": str(self.p1.id), "quantity": 4},
+                {"product_id": str(self.p2.id), "quantity": 0},
+                {"product_id": str(p3.id), "quantity": 2},
+            ], format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        lines = dict(cart.items.values_list("product_id", "quantity"))
+        self.assertEqual(lines, {self.p1.id: 4, p3.id: 2})
+        self.assertEqual(cart.items.get(product=self.p1).pk, kept.pk)
+        writes = [q["sql"].split(" ", 1)[0] for q in ctx.captured_queries
+                  if '"carts_cartitem"' in q["sql"] and not q["sql"].startswith("SELECT")]
+        self.assertEqual(sorted(writes), ["DELETE", "INSERT", "UPDATE"])
+
+    @override_settings(CART_STORE_BACKEND="carts.stores.InMemoryCartStore")
+    def test_replace_items_with_hot_cart_store(self):
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.put("/api/carts/me/items/", [{"product_id": str(self.p2.id), "quantity": 2}], format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["quantity"] for row in resp.data["items"]], [2])
+        self.assertFalse(CartItem.objects.exists())
+        persist_dirty_carts()
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+        resp = self.client.put("/api/carts/me/items/", [], format="json")
+        self.assertEqual(resp.data["totals"]["item_count"], 0)
+        self.assertEqual(resp.data["totals"]["total"], "0.00")
+
+    def test_cart_lines_hold_stock_until_they_expire(self):
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.post("/api/cart-items/", {"product_id": str(self.p2.id), "quantity": 2}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p2.stock, self.p2.reserved), (2, 2))
+
+        self.client.force_authenticate(user=self.other)
+        resp = self.client.post("/api/cart-items/", {"product_id": str(self.p2.id), "quantity": 1}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        StockReservation.objects.filter(user=self.user).update(expires_at=timezone.now())
+        release_expired_reservations()
+        resp = self.client.post("/api/cart-items/", {"product_id": str(self.p2.id), "quantity": 1}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        resp = self.client.post("/api/orders/", {
+            "order_items": [{"product_id": str(self.p2.id), "quantity": 1}],
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        hold = StockReservation.objects.get(user=self.other)
+        self.assertEqual((hold.status, str(hold.order_id)), (StockReservation.STATUS_COMMITTED, resp.data["id"]))
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p2.stock, self.p2.reserved), (2, 1))
+
+    def test_cart_lines_are_compact_with_server_totals(self):
+        Product.objects.filter(pk=self.p1.pk).update(discount_percent=10)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.p1, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.p2, quantity=1)
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(3):  # count, carts with totals, lines with products
+            resp = self.client.get(self.list_url)
+        data = resp.data["results"][0]
+        line = next(row for row in data["items"] if row["product_id"] == str(self.p1.id))
+        self.assertEqual(set(line), {
+            "id", "product_id", "title", "unit_price", "discount_percent", "effective_price",
+            "quantity", "line_total", "primary_image", "created_at",
+        })
+        self.assertEqual((line["effective_price"], line["line_total"]), ("45.00", "90.00"))
+        self.assertEqual(dict(data["totals"]), {
+            "item_count": 2, "units": 3, "subtotal": "130.00", "discount": "10.00", "total": "120.00",
+        })
+
+        with override_settings(CART_STORE_BACKEND="carts.stores.InMemoryCartStore"):
+            resp = self.client.get(self.list_url)
+            self.assertEqual(resp.data["results"][0]["totals"]["total"], "120.00")
+
+
+@skipUnless(redis_available(), "needs a Redis server at TEST_REDIS_URL")
+@override_settings(
+    CART_STORE_BACKEND="carts.stores.RedisCartStore",
+    CART_STORE_OPTIONS={"url": TEST_REDIS_URL, "prefix": "prodev-test"},
+)
+class RedisCartStoreTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@test.com", username="user", password="password123")
+        cat = Category.objects.create(name="Electronics", slug="electronics")
+        self.product = Product.objects.create(title="Prod A", slug="prod-a", category=cat, price=50, stock=10)
+        self.store = get_cart_store()
+        self.addCleanup(lambda: self.store.redis.delete(*self.store.redis.keys("prodev-test:*") or ["-"]))
+
+    def test_writes_for_uuid_users_persist_behind(self):
+        self.assertIsInstance(self.store, RedisCartStore)
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.post("/api/cart-items/", {"product_id": str(self.product.id), "quantity": 2}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        resp = self.client.patch(f"/api/cart-items/{resp.data['id']}/", {"quantity": 3}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        # an expired cart is seeded from the database by the write itself
+        self.store.redis.delete(*self.store._keys(self.user.pk))
+        line = self.store.add(self.user.pk, self.product.pk, 1, lambda: snapshot_from_db(self.user.pk))
+        self.assertEqual(line.quantity, 1)
+
+        self.assertEqual(self.store.claim_dirty(), [self.user.pk])
+        self.store.mark_dirty(self.user.pk)
+        persist_dirty_carts()
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 1)
+
+        self.store.discard(self.user.pk)
+        self.assertIsNone(self.store.get(self.user.pk))
+        self.assertEqual(self.store.claim_dirty(), [])
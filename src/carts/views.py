@@ -1,27 +1,60 @@
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import permissions
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from utils.pagination import StandardResultsSetPagination
+from utils.fieldsets import SparseQuerysetMixin
 from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
 from drf_yasg.utils import swagger_auto_schema
 from products.models import Product
+from products.reservations import InsufficientStock, available_to, hold_for_cart, release_user_holds
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from .serializers import CartSerializer, CartItemSerializer, CartItemsReplaceSerializer
+from .pricing import cart_totals_annotations
+from .stores import CartSnapshot, get_cart_store, new_line
+from .sync import build_cart, build_item, load_cart, snapshot_from_db
 from .docs import (
     cart_list_summary, cart_list_description, cart_list_responses,
     cart_retrieve_summary, cart_retrieve_responses, cart_retrieve_description,
     cart_item_create_summary, cart_item_create_description, cart_item_create_responses,
     cart_item_update_summary, cart_item_update_description, cart_item_update_responses,
+    cart_items_replace_summary, cart_items_replace_description, cart_items_replace_request,
+    cart_items_replace_responses,
 )
 
-class CartViewSet(ModelViewSet):
+class HotCartMixin:
+    """
+    Helpers for serving the requesting user's cart from the hot cart store
+    (carts.stores) when CART_STORE_BACKEND is set. Staff access to other
+    users' carts always goes to the database.
+    """
+
+    def hot_cart_store(self):
+        return get_cart_store()
+
+    def hot_snapshot(self):
+        return load_cart(self.hot_cart_store(), self.request.user.pk)
+
+    def hot_seed(self):
+        """Loads the user's cart from the database if a store write finds it missing."""
+        user_id = self.request.user.pk
+        return lambda: snapshot_from_db(user_id)
+
+    def hot_cart(self, *prefetch):
+        return build_cart(self.hot_snapshot(), self.request.user, prefetch)
+
+
+class CartViewSet(HotCartMixin, SparseQuerysetMixin, ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    sparse_prefetch = {"items": (Prefetch("items", queryset=CartItem.objects.select_related("product")),)}
 
     def get_queryset(self):
-        qs = Cart.objects.select_related("user").prefetch_related("items__product")
+        qs = Cart.objects.select_related("user").annotate(**cart_totals_annotations())
         if getattr(self, "swagger_fake_view", False):
             return qs.none()
         
@@ -30,13 +63,110 @@ class CartViewSet(ModelViewSet):
             return qs.all()
         return qs.filter(user=user)
     
+    def get_object(self):
+        if self.hot_cart_store() and self.action in ("retrieve", "destroy"):
+            snapshot = self.hot_snapshot()
+            if snapshot.cart_id == str(self.kwargs.get("pk")):
+                return build_cart(snapshot, self.request.user)
+        return super().get_object()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        release_user_holds(instance.user_id)
+        store = self.hot_cart_store()
+        if store:
+            store.discard(instance.user_id)
+
     def create(self, request, *args, **kwargs):
+        if self.hot_cart_store():
+            return Response(self.get_serializer(self.hot_cart()).data)
         cart, created = Cart.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["put"], url_path="me/items")
+    @swagger_auto_schema(
+        operation_summary=cart_items_replace_summary,
+        operation_description=cart_items_replace_description,
+        request_body=cart_items_replace_request,
+        responses=cart_items_replace_responses,
+        tags=["Carts"],
+    )
+    def replace_items(self, request):
+        serializer = CartItemsReplaceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        wanted = {line["product_id"]: line["quantity"] for line in serializer.validated_data if line["quantity"]}
+
+        if self.hot_cart_store():
+            snapshot = self.hot_snapshot()
+            with transaction.atomic():
+                self.check_cart_lines(request.user.pk, wanted, Product.objects.filter(id__in=list(wanted)).in_bulk())
+                self.hold_cart_lines(request.user.pk, wanted, [line.product_id for line in snapshot.lines.values()])
+            lines = {}
+            for product_id, quantity in wanted.items():
+                line = snapshot.lines.get(str(product_id)) or new_line(product_id)
+                line.quantity = quantity
+                lines[str(product_id)] = line
+            self.hot_cart_store().replace(request.user.pk, CartSnapshot(snapshot.cart_id, lines))
+            return Response(self.get_serializer(self.hot_cart()).data)
+
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user=request.user)
+            cart = Cart.objects.select_for_update().get(pk=cart.pk)
+            products = Product.objects.filter(id__in=list(wanted)).in_bulk()
+            self.check_cart_lines(request.user.pk, wanted, products)
+
+            existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+            self.hold_cart_lines(request.user.pk, wanted, existing)
+            CartItem.objects.filter(cart=cart).exclude(product_id__in=list(wanted)).delete()
+            changed = []
+            for product_id, quantity in wanted.items():
+                item = existing.get(product_id)
+                if item is not None and item.quantity != quantity:
+                    item.quantity = quantity
+                    changed.append(item)
+            CartItem.objects.bulk_update(changed, ["quantity"])
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=products[product_id], quantity=quantity)
+                for product_id, quantity in wanted.items() if product_id not in existing
+            ])
+
+        cart = self.get_queryset().prefetch_related(*self.sparse_prefetch["items"]).get(pk=cart.pk)
+        return Response(self.get_serializer(cart).data)
+
+    def hold_cart_lines(self, user_id, wanted, current):
+        """
+        Point the user's stock holds at the new lines, in product id order so
+        concurrent syncs touch product rows in the same order.
+        """
+        targets = {str(product_id): wanted.get(product_id, 0) for product_id in wanted}
+        targets.update({str(product_id): 0 for product_id in current if str(product_id) not in targets})
+        errors = {}
+        for product_id in sorted(targets):
+            try:
+                hold_for_cart(user_id, product_id, targets[product_id])
+            except InsufficientStock:
+                errors[product_id] = "Not enough stock available."
+        if errors:
+            raise ValidationError({"items": errors})
+
+    def check_cart_lines(self, user_id, wanted, products):
+        available = available_to(user_id, products.values())
+        errors = {}
+        for product_id, quantity in wanted.items():
+            product = products.get(product_id)
+            if product is None or product.is_deleted:
+                errors[str(product_id)] = "Product does not exist."
+            elif available[product_id] < quantity:
+                errors[str(product_id)] = "Not enough stock available."
+        if errors:
+            raise ValidationError({"items": errors})
+
     @swagger_auto_schema(operation_summary=cart_list_summary, operation_description=cart_list_description, responses=cart_list_responses, tags=["Carts"])
     def list(self, request, *args, **kwargs):
+        if self.hot_cart_store() and not request.user.is_staff:
+            page = self.paginate_queryset([self.hot_cart()])
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
         return super().list(request, *args, **kwargs)
 
     @swagger_auto_schema(operation_summary=cart_retrieve_summary, operation_description=cart_retrieve_description, responses=cart_retrieve_responses, tags=["Carts"])
@@ -56,7 +186,7 @@ class CartViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class CartItemViewSet(ModelViewSet):
+class CartItemViewSet(HotCartMixin, ModelViewSet):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
@@ -70,6 +200,16 @@ class CartItemViewSet(ModelViewSet):
             return qs.all()
         return qs.filter(cart__user=user)
 
+    def get_object(self):
+        if not self.hot_cart_store() or self.request.user.is_staff:
+            return super().get_object()
+        snapshot = self.hot_snapshot()
+        line = snapshot.line_by_id(self.kwargs.get("pk"))
+        if line is None:
+            raise Http404
+        cart = Cart(id=snapshot.cart_id, user=self.request.user)
+        return build_item(cart, line, Product.objects.get(pk=line.product_id))
+
     def perform_create(self, serializer):
         user = self.request.user
         product = serializer.validated_data.pop('product_obj') 
@@ -77,21 +217,32 @@ class CartItemViewSet(ModelViewSet):
 
         quantity = serializer.validated_data.get("quantity", 1)
 
+        store = self.hot_cart_store()
+        if store:
+            # the increment is atomic in the store and the stock hold is
+            # checked against the new total
+            snapshot = self.hot_snapshot()
+            line = store.add(user.pk, product.pk, quantity, self.hot_seed())
+            try:
+                hold_for_cart(user.pk, product.pk, line.quantity)
+            except InsufficientStock:
+                store.add(user.pk, product.pk, -quantity, self.hot_seed())
+                raise ValidationError({"quantity": "Not enough stock available for total quantity."})
+            serializer.instance = build_item(Cart(id=snapshot.cart_id, user=user), line, product)
+            return
+
+        # No Product row lock: the stock hold is one conditional UPDATE
         with transaction.atomic():
-            product = Product.objects.select_for_update().get(pk=product.id)
-            cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
-
-            if hasattr(product, "stock") and product.stock < quantity:
-                raise ValidationError({"quantity": "Not enough stock available."})
-
-            item_qs = CartItem.objects.select_for_update().filter(cart=cart, product=product)
-            if item_qs.exists():
-                item = item_qs.get()
-                new_qty = item.quantity + quantity
-                if hasattr(product, "stock") and product.stock < new_qty:
-                    raise ValidationError({"quantity": "Not enough stock available for total quantity."})
+            cart, _ = Cart.objects.get_or_create(user=user)
+            item = CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+            new_qty = (item.quantity if item else 0) + quantity
+            try:
+                hold_for_cart(user.pk, product.pk, new_qty)
+            except InsufficientStock:
+                raise ValidationError({"quantity": "Not enough stock available for total quantity."})
+            if item:
                 item.quantity = new_qty
-                item.save()
+                item.save(update_fields=["quantity"])
             else:
                 serializer.save(cart=cart, product=product)
 
@@ -99,15 +250,33 @@ class CartItemViewSet(ModelViewSet):
         quantity = serializer.validated_data.get("quantity")
         instance = serializer.instance
 
-        if quantity is not None:
-             with transaction.atomic():
-                product = Product.objects.select_for_update().get(pk=instance.product.id)
-                if hasattr(product, "stock") and product.stock < quantity:
-                     raise ValidationError({"quantity": "Not enough stock available."})
-                serializer.save()
-        else:
+        store = self.hot_cart_store()
+        if store and not self.request.user.is_staff:
+            if quantity is not None:
+                self.hold_item(instance.cart.user_id, instance.product_id, quantity)
+                store.set_quantity(self.request.user.pk, instance.product_id, quantity, self.hot_seed())
+                instance.quantity = quantity
+            return
+
+        with transaction.atomic():
+            if quantity is not None:
+                self.hold_item(instance.cart.user_id, instance.product_id, quantity)
             serializer.save()
 
+    def hold_item(self, user_id, product_id, quantity):
+        try:
+            hold_for_cart(user_id, product_id, quantity)
+        except InsufficientStock:
+            raise ValidationError({"quantity": "Not enough stock available."})
+
+    def perform_destroy(self, instance):
+        hold_for_cart(instance.cart.user_id, instance.product_id, 0)
+        store = self.hot_cart_store()
+        if store and not self.request.user.is_staff:
+            store.remove(self.request.user.pk, instance.product_id, self.hot_seed())
+            return
+        super().perform_destroy(instance)
+
     @swagger_auto_schema(operation_summary=cart_item_create_summary, operation_description=cart_item_create_description, responses=cart_item_create_responses, tags=["Cart-Item"])
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
@@ -126,6 +295,9 @@ class CartItemViewSet(ModelViewSet):
     
     @swagger_auto_schema(operation_summary="List cart items", operation_description="List cart items for the authenticated user", responses={200: CartItemSerializer(many=True)}, tags=["Cart-Item"])
     def list(self, request, *args, **kwargs):
+        if self.hot_cart_store() and not request.user.is_staff:
+            page = self.paginate_queryset(self.hot_cart("images").lines)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
         return super().list(request, *args, **kwargs)
 
     @swagger_auto_schema(operation_summary="Retrieve cart item", operation_description="Get a single cart item by id", responses={200: CartItemSerializer()}, tags=["Cart-Item"])
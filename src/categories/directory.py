@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db.models import Count
+from utils.cache import bump_version_stamp, cache_single_flight, get_version_stamp
+from .models import Category
+
+CATEGORY_VERSION_KEY = "categories:version"
+PRODUCT_COUNTS_KEY = "categories:product-counts"
+
+
+def get_category_version():
+    """Version stamp of the category table; bumped on every Category write."""
+    return get_version_stamp(CATEGORY_VERSION_KEY)
+
+
+def bump_category_version():
+    bump_version_stamp(CATEGORY_VERSION_KEY)
+
+
+def direct_product_counts(version):
+    """
+    {category id hex: active products filed directly under it}. Shared
+    through the cache for CATEGORY_PRODUCT_COUNT_TTL seconds (and per
+    category version), so the products GROUP BY runs at most once per TTL
+    across all processes.
+    """
+    def compute():
+        from products.models import Product
+
+        return {
+            category_id.hex: count for category_id, count in
+            Product.objects.filter(is_deleted=False, is_active=True)
+            .values_list("category_id").annotate(count=Count("id")).order_by()
+        }
+
+    return cache_single_flight(
+        f"{PRODUCT_COUNTS_KEY}:{version}", compute, timeout=settings.CATEGORY_PRODUCT_COUNT_TTL
+    )
+
+
+class CategoryDirectory:
+    """
+    Snapshot of the whole category table, built from one query and reloaded
+    only when a category changes. Product counts roll up the products of
+    every descendant category and are refreshed on their own TTL, so product
+    writes don't reload anything.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.categories = list(Category.objects.all())
+        self.by_id = {category.pk: category for category in self.categories}
+        self.by_slug = {category.slug.lower(): category for category in self.categories}
+        self._totals = None
+        self._counted_at = 0
+        self._counts_lock = threading.Lock()
+
+    def get(self, slug):
+        return self.by_slug.get(slug.strip().lower())
+
+    def product_counts(self):
+        """{category id: active products in it and its descendants}."""
+        with self._counts_lock:
+            if self._totals is None or time.monotonic() - self._counted_at >= settings.CATEGORY_PRODUCT_COUNT_TTL:
+                direct = direct_product_counts(self.version)
+                totals = Counter()
+                for category in self.categories:
+                    count = direct.get(category.pk.hex, 0)
+                    for ancestor in category.path.split("/")[:-1]:
+                        totals[ancestor] += count
+                self._totals = {category.pk: totals[category.pk.hex] for category in self.categories}
+                self._counted_at = time.monotonic()
+            return self._totals
+
+    def product_count(self, category_id):
+        return self.product_counts().get(category_id, 0)
+
+
+_directory = None
+_lock = threading.Lock()
+
+
+def get_category_directory():
+    """The per-process directory, reloaded when the category version changes."""
+    global _directory
+    version = get_category_version()
+    directory = _directory
+    if directory is not None and directory.version == version:
+        return directory
+    with _lock:
+        if _directory is None or _directory.version != version:
+            _directory = CategoryDirectory(version)
+        return _directory
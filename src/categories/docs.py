@@ -3,7 +3,8 @@ from .serializers import CategorySerializer
 
 list_summary = "List all categories"
 list_description = (
-    "Returns a list of all product categories.\n\n"
+    "Returns a list of all product categories, served from an in-process snapshot. "
+    "`product_count` counts active products in the category and its subcategories.\n\n"
     "Accessible to all users (no authentication required)."
 )
 
@@ -30,8 +31,10 @@ create_description = (
     "{\n"
     "  \"name\": \"Electronics\",\n"
     "  \"slug\": \"electronics\",\n"
-    "  \"description\": \"Devices, gadgets, and appliances\"\n"
-    "}"
+    "  \"description\": \"Devices, gadgets, and appliances\",\n"
+    "  \"parent\": null\n"
+    "}\n\n"
+    "Set `parent` to another category's ID to nest it; moving a category moves its whole subtree."
 )
 
 create_responses = {
@@ -1,11 +1,24 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 
 class Category(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=150, null=False)
     slug = models.SlugField(max_length=160, unique=True)
     description = models.TextField(null=True, blank=True)
+    parent = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="children"
+    )
+    # Materialized path of ancestor ids, e.g. "<root hex>/<child hex>/"; a
+    # subtree is every row whose path starts with its root's path.
+    path = models.CharField(max_length=1000, editable=False, default="")
+    depth = models.PositiveSmallIntegerField(editable=False, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -16,7 +29,44 @@ class Category(models.Model):
         indexes = [
             models.Index(fields=["slug"]),
             models.Index(fields=["name"]),
+            # pattern ops so `path LIKE 'prefix%'` is an index range scan on PostgreSQL
+            models.Index(fields=["path"], name="categories_path_idx", opclasses=["varchar_pattern_ops"]),
         ]
 
     def __str__(self):
         return self.name
+
+    def build_path(self):
+        prefix = self.parent.path if self.parent_id else ""
+        return f"{prefix}{self.id.hex}/"
+
+    def save(self, *args, **kwargs):
+        old_path = self.path
+        self.path = self.build_path()
+        self.depth = self.path.count("/") - 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "path", "depth"}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                self.move_descendants(old_path)
+
+    def move_descendants(self, old_path):
+        """Rewrite the paths below this node after it moved, in one UPDATE."""
+        Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+            path=Concat(Value(self.path), Substr("path", len(old_path) + 1)),
+            depth=F("depth") + (self.path.count("/") - old_path.count("/")),
+        )
+
+    def is_descendant_of(self, other):
+        return self.path.startswith(other.path) and self.pk != other.pk
+
+    def subtree(self):
+        """
+        This category and everything below it. The prefix is this row's own
+        path, passed as a literal so `path LIKE 'prefix%'` can use the
+        pattern-ops index (a subquery prefix can't).
+        """
+        return Category.objects.filter(path__startswith=self.path)
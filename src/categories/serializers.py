@@ -1,7 +1,28 @@
 from rest_framework import serializers
 from .models import Category
+from .directory import get_category_directory
 
 class CategorySerializer(serializers.ModelSerializer):
+    product_count = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = Category
-        fields = ("id", "name", "slug", "description", "created_at", "updated_at")
+        fields = ("id", "name", "slug", "description", "parent", "depth", "product_count", "created_at", "updated_at")
+        read_only_fields = ("depth", "product_count")
+
+    def get_product_count(self, obj):
+        """Active products in this category and its subcategories."""
+        return self.directory.product_count(obj.pk)
+
+    @property
+    def directory(self):
+        # resolved once per serialization: list rows share the root's context
+        context = self.context
+        if "category_directory" not in context:
+            context["category_directory"] = get_category_directory()
+        return context["category_directory"]
+
+    def validate_parent(self, parent):
+        if parent and self.instance and (parent.pk == self.instance.pk or parent.is_descendant_of(self.instance)):
+            raise serializers.ValidationError("A category can't be moved under itself or its descendants.")
+        return parent
@@ -1,7 +1,14 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from categories.directory import CategoryDirectory
 from categories.models import Category
+from categories.serializers import CategorySerializer
+from products.models import Product
 
 User = get_user_model()
 class CategoryAPITestCase(APITestCase):
@@ -80,4 +87,70 @@ class CategoryAPITestCase(APITestCase):
         response = self.client.delete(url)
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
\ No newline at end of file
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+
+    def test_moving_a_category_moves_its_subtree(self):
+        computers = Category.objects.create(name="Computers", slug="computers", parent=self.category)
+        laptops = Category.objects.create(name="Laptops", slug="laptops", parent=computers)
+        self.assertEqual(laptops.depth, 2)
+        self.assertTrue(laptops.path.startswith(self.category.path))
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.patch(f"/api/categories/{self.category.id}/", {"parent": str(laptops.id)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        office = Category.objects.create(name="Office", slug="office")
+        response = self.client.patch(f"/api/categories/{computers.id}/", {"parent": str(office.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        laptops.refresh_from_db()
+        self.assertEqual(laptops.path, f"{office.id.hex}/{computers.id.hex}/{laptops.id.hex}/")
+        self.assertEqual(laptops.depth, 2)
+
+    def test_subtree_filters_on_a_literal_path_prefix(self):
+        computers = Category.objects.create(name="Computers", slug="computers", parent=self.category)
+        Category.objects.create(name="Office", slug="office")
+
+        subtree = self.category.subtree()
+        self.assertEqual(set(subtree.values_list("slug", flat=True)), {"electronics", "computers"})
+        sql, params = subtree.query.sql_with_params()
+        self.assertNotIn("SELECT", sql.split("WHERE", 1)[1])
+        self.assertIn(f"{self.category.path}%", params)
+        self.assertEqual(list(computers.subtree()), [computers])
+
+    def test_list_serves_product_counts_from_directory(self):
+        laptops = Category.objects.create(name="Laptops", slug="laptops", parent=self.category)
+        Product.objects.create(title="Laptop", category=laptops, price=900, stock=3)
+        Product.objects.create(title="Radio", category=self.category, price=40, stock=3)
+        Product.objects.create(title="Old Radio", category=self.category, price=20, is_active=False)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.list_url)
+        counts = {row["slug"]: row["product_count"] for row in response.data["results"]}
+        self.assertEqual(counts, {"electronics": 2, "laptops": 1})
+
+        # the directory (and its version stamp lookup) is resolved once per list
+        serializer = CategorySerializer(Category.objects.all(), many=True)
+        serializer.data
+        self.assertIsInstance(serializer.context["category_directory"], CategoryDirectory)
+
+        # product writes don't reload the directory; counts refresh on their TTL
+        Product.objects.create(title="Tablet", category=laptops, price=300, stock=1)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.list_url)
+        self.assertFalse(any('"products_product"' in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(response.data["results"][0]["product_count"], 2)
+
+        cache.clear()  # the shared counts expire
+        with override_settings(CATEGORY_PRODUCT_COUNT_TTL=0):
+            response = self.client.get(self.list_url)
+        counts = {row["slug"]: row["product_count"] for row in response.data["results"]}
+        self.assertEqual(counts, {"electronics": 3, "laptops": 2})
+
+    def test_list_applies_ordering(self):
+        Category.objects.create(name="Appliances", slug="appliances")
+        Category.objects.create(name="Books", slug="books")
+
+        response = self.client.get(self.list_url, {"ordering": "name"})
+        self.assertEqual([row["slug"] for row in response.data["results"]], ["appliances", "books", "electronics"])
+        response = self.client.get(self.list_url, {"ordering": "-name"})
+        self.assertEqual(response.data["results"][0]["slug"], "electronics")
@@ -3,6 +3,7 @@ from .models import Category
 from .serializers import CategorySerializer
 from core import permissions
 from utils.pagination import StandardResultsSetPagination
+from utils.cache import CatalogCacheMixin
 from drf_yasg.utils import swagger_auto_schema
 from .docs import (
     list_summary, list_description, list_responses,
@@ -13,7 +14,7 @@ from .docs import (
     delete_summary, delete_description, delete_responses
 )
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAdminOrReadOnly]
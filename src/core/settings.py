@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 import os
 from datetime import timedelta
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv()
 
@@ -43,7 +44,61 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
 
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "prodev",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Catalog response cache (utils/cache.py), in seconds
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))
+CATALOG_CACHE_LOCK_TIMEOUT = 10
+CATALOG_CACHE_LOCK_WAIT = 2
+
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    "sweep-orphaned-product-image-blobs": {
+        "task": "products.tasks.sweep_orphaned_blobs",
+        "schedule": 60 * 60,
+    },
+    "persist-dirty-carts": {
+        "task": "carts.tasks.persist_dirty_carts",
+        "schedule": 60,
+    },
+    "release-expired-stock-reservations": {
+        "task": "products.tasks.release_expired_reservations",
+        "schedule": 60,
+    },
+    "reconcile-order-totals": {
+        "task": "orders.tasks.reconcile_order_totals",
+        "schedule": 6 * 60 * 60,
+    },
+}
+
+# Hot cart store (carts/stores.py), e.g. "carts.stores.RedisCartStore";
+# unset keeps carts in the database only
+CART_STORE_BACKEND = os.getenv("CART_STORE_BACKEND")
+CART_STORE_OPTIONS = {}
+CART_STORE_TTL = int(os.getenv("CART_STORE_TTL", 7 * 24 * 60 * 60))
+
+# How stale category product counts may get (categories.directory)
+CATEGORY_PRODUCT_COUNT_TTL = int(os.getenv("CATEGORY_PRODUCT_COUNT_TTL", 60))
+
+# Stock holds (products.reservations): how long a cart line holds its units,
+# and how long checkout holds them while the order waits for payment
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 15 * 60))
+STOCK_RESERVATION_ORDER_TTL = int(os.getenv("STOCK_RESERVATION_ORDER_TTL", 60 * 60))
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -137,9 +192,45 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = '/app/staticfiles'
 
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", BASE_DIR / "media")
+
+# Without Cloudinary credentials (local dev, tests) media goes to MEDIA_ROOT.
+MEDIA_STORAGE_BACKEND = (
+    "cloudinary_storage.storage.MediaCloudinaryStorage"
+    if CLOUDINARY_CLOUD_NAME
+    else "django.core.files.storage.FileSystemStorage"
+)
+
+# Product image uploads are staged on the filesystem under
+# PRODUCT_IMAGE_STAGING_ROOT, so requests never wait on remote media storage,
+# and moved into place by a Celery task. The root must be mounted on web and
+# worker machines alike; it defaults to MEDIA_ROOT/staging only when media is
+# itself on the local filesystem.
+PRODUCT_IMAGE_STAGING_ROOT = os.getenv("PRODUCT_IMAGE_STAGING_ROOT", "")
+if not PRODUCT_IMAGE_STAGING_ROOT:
+    if MEDIA_STORAGE_BACKEND != "django.core.files.storage.FileSystemStorage":
+        raise ImproperlyConfigured(
+            "PRODUCT_IMAGE_STAGING_ROOT must be set to a volume shared by web and worker "
+            "machines when media is stored remotely."
+        )
+    PRODUCT_IMAGE_STAGING_ROOT = os.path.join(MEDIA_ROOT, "staging")
+PRODUCT_IMAGE_STAGING_PREFIX = os.getenv("PRODUCT_IMAGE_STAGING_PREFIX", "staging/product-images")
+PRODUCT_IMAGE_UPLOAD_WORKERS = int(os.getenv("PRODUCT_IMAGE_UPLOAD_WORKERS", 4))
+PRODUCT_IMAGE_PERCEPTUAL_HASH = os.getenv("PRODUCT_IMAGE_PERCEPTUAL_HASH", "True") == "True"
+
+# Multipart limits for product/image create and update (products/uploads.py)
+PRODUCT_UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("PRODUCT_UPLOAD_MAX_REQUEST_BYTES", 50 * 1024 * 1024))
+PRODUCT_IMAGE_MAX_BYTES = int(os.getenv("PRODUCT_IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+PRODUCT_IMAGE_MAX_DIMENSION = int(os.getenv("PRODUCT_IMAGE_MAX_DIMENSION", 6000))
+PRODUCT_IMAGE_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": MEDIA_STORAGE_BACKEND,
+    },
+    "image_staging": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": PRODUCT_IMAGE_STAGING_ROOT},
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
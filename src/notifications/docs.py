@@ -4,7 +4,8 @@ from .serializers import NotificationSerializer
 list_summary = "List notifications"
 list_description = (
     "List all notifications for the authenticated user. "
-    "Notifications are ordered by newest first and returned as paginated results."
+    "Notifications are ordered by newest first and returned as paginated results. "
+    "Pass `pagination=cursor` to page with signed cursor links instead of page numbers."
 )
 list_responses = {200: openapi.Response("List of notifications", schema=NotificationSerializer(many=True))}
 
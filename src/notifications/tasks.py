@@ -1,5 +1,6 @@
 from celery import shared_task
 from celery.exceptions import Retry
+from django.contrib.auth import get_user_model
 from .models import Notification
 from products.models import Product
 from orders.models import Order 
@@ -19,6 +20,39 @@ def send_new_product_notification(self, product_id):
     return "product_notification_sent"
 
 
+@shared_task
+def send_new_products_digest(product_ids, batch_size=1000):
+    """
+    One notification per active user for a whole bulk import, instead of
+    one task per imported product.
+    """
+    products = Product.objects.filter(id__in=product_ids, is_deleted=False)
+    count = products.count()
+    if not count:
+        return "product_digest_skipped"
+
+    titles = list(products.order_by("title").values_list("title", flat=True)[:5])
+    more = f" and {count - len(titles)} more" if count > len(titles) else ""
+    message = f"New products added: {', '.join(titles)}{more}"
+
+    user_ids = get_user_model().objects.filter(is_active=True).values_list("id", flat=True)
+    batch = []
+    for user_id in user_ids.iterator(chunk_size=batch_size):
+        batch.append(Notification(
+            user_id=user_id,
+            notif_type=Notification.TYPE_PRODUCT,
+            title=f"{count} new products",
+            message=message,
+        ))
+        if len(batch) >= batch_size:
+            Notification.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Notification.objects.bulk_create(batch)
+
+    return "product_digest_sent"
+
+
 @shared_task(bind=True, max_retries=3)
 def send_order_confirmation(self, order_id):
     try:
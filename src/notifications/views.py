@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.db import transaction
-from utils.pagination import StandardResultsSetPagination
+from utils.pagination import CursorOrPageNumberPagination
 from .models import Notification
 from .serializers import NotificationSerializer
 from .docs import (
@@ -17,7 +17,7 @@ from .docs import (
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CursorOrPageNumberPagination
 
     def get_queryset(self):
         qs = Notification.objects.select_related("user")
@@ -4,12 +4,17 @@ from .serializers import OrderSerializer, OrderItemSerializer
 list_summary = "List orders"
 list_description = (
     "Return paginated orders for the authenticated user. Admins can list all orders.\n\n"
-    "Order detail includes nested items when available."
+    "Order detail includes nested items when available. "
+    "Pass `pagination=cursor` to page with signed cursor links instead of page numbers."
 )
 list_responses = {200: openapi.Response("A paginated list of orders", OrderSerializer(many=True))}
 
 retrieve_summary = "Retrieve order"
-retrieve_description = "Return a single order with nested items. Only the owner or admin can access."
+retrieve_description = (
+    "Return a single order with nested items. Only the owner or admin can access.\n\n"
+    "Items carry the product as it was bought (title, slug, image, unit price, discount). "
+    "Pass `expand=product` to also include each item's live product."
+)
 retrieve_responses = {200: OrderSerializer(), 404: openapi.Response("Not found")}
 
 create_summary = "Create order"
@@ -22,7 +27,8 @@ create_responses = {201: OrderSerializer(), 400: openapi.Response("Validation er
 order_item_create_summary = "Create order item"
 order_item_create_description = (
     "Add an item to an order. Payload: {\"order_id\": \"<order-uuid>\", \"product_id\": \"<product-uuid>\", \"quantity\": n}.\n\n"
-    "Server snapshots the product price into unit_price and calculates total_price."
+    "Server snapshots the product title, slug, primary image, price and discount onto the item "
+    "and calculates total_price."
 )
 order_item_create_responses = {201: OrderItemSerializer(), 400: openapi.Response("Validation error")}
 
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_orderitem_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='fulfilled_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('P', 'Pending'), ('A', 'Paid'), ('S', 'Shipped'), ('D', 'Delivered')], default='P', max_length=1),
+        ),
+    ]
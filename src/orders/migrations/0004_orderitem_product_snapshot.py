@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:21
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_snapshots(apps, schema_editor):
+    # Existing lines get the product as it is now, the closest we have
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("products", "Product")
+    product = Product.objects.filter(pk=OuterRef("product_id"))
+    OrderItem.objects.update(
+        product_title=Subquery(product.values("title")[:1]),
+        product_slug=Subquery(product.values("slug")[:1]),
+        discount_percent=Subquery(product.values("discount_percent")[:1]),
+        product_image_url=Subquery(product.values("primary_image_url")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_fulfilled_at'),
+        ('products', '0004_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount_percent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_slug',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_title',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
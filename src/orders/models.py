@@ -1,15 +1,18 @@
 import uuid
 from decimal import Decimal
 from django.db import models
+from django.db.models import F, Sum
 from django.core.validators import MinValueValidator
 
 class Order(models.Model):
     STATUS_PENDING = "P"
+    STATUS_PAID = "A"
     STATUS_SHIPPED = "S"
     STATUS_DELIVERED = "D"
 
     ORDER_STATUS_CHOICES = [
         (STATUS_PENDING, "Pending"),
+        (STATUS_PAID, "Paid"),
         (STATUS_SHIPPED, "Shipped"),
         (STATUS_DELIVERED, "Delivered"),
     ]
@@ -25,6 +28,8 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     currency = models.CharField(max_length=3, default="USD")
     status = models.CharField(max_length=1, choices=ORDER_STATUS_CHOICES, default=STATUS_PENDING)
+    # set once stock has been taken for the order; guards against double fulfillment
+    fulfilled_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -36,10 +41,21 @@ class Order(models.Model):
         ]
 
     def update_total(self):
-        total = sum(item.total_price for item in self.items.all())
-        self.total_amount = total
+        """Recompute the total from the items in one aggregate query."""
+        total = self.items.aggregate(total=Sum("total_price"))["total"]
+        self.total_amount = total or Decimal("0.00")
         self.save(update_fields=["total_amount"])
 
+    def add_to_total(self, delta):
+        """
+        Shift the stored total by a line's price change without reading the
+        items. Callers hold the order row lock, so the in-memory total stays
+        in step with the row.
+        """
+        if delta:
+            Order.objects.filter(pk=self.pk).update(total_amount=F("total_amount") + delta)
+            self.total_amount += delta
+
     def __str__(self):
         return f"Order {self.id} - {self.get_status_display()}"
 
@@ -51,6 +67,11 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     total_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    # What the buyer saw when the line was added; see snapshot_product()
+    product_title = models.CharField(max_length=255, blank=True, default="")
+    product_slug = models.CharField(max_length=255, blank=True, default="")
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    product_image_url = models.CharField(max_length=500, blank=True, default="")
 
     class Meta:
         ordering = ["id"]
@@ -59,6 +80,15 @@ class OrderItem(models.Model):
             models.Index(fields=["product"]),
         ]
 
+    def snapshot_product(self, product):
+        """Copy the product's current title, price and image onto the line; later edits don't change it."""
+        self.product = product
+        self.product_title = product.title
+        self.product_slug = product.slug
+        self.unit_price = product.price
+        self.discount_percent = product.discount_percent
+        self.product_image_url = product.primary_image_url
+
     def save(self, *args, **kwargs):
         self.total_price = (self.unit_price or Decimal("0.00")) * self.quantity
         super().save(*args, **kwargs)
@@ -1,19 +1,68 @@
+import uuid
+from django.db import transaction
 from rest_framework import serializers
+from utils.fieldsets import SparseFieldsetsMixin, wants_expansion
 from .models import Order, OrderItem
 from products.serializers import ProductSerializer
 from products.models import Product
+from products.reservations import InsufficientStock, available_to, commit_holds
+
+PRODUCT_EXPANSION = "product"
+
+
+def expands_product(request, view):
+    """Live products are only rendered on detail requests asking for `?expand=product`."""
+    return (
+        request is not None
+        and getattr(view, "action", None) == "retrieve"
+        and wants_expansion(request, PRODUCT_EXPANSION)
+    )
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    """
+    An order line as it was bought: the product_* fields, unit price and
+    discount are the snapshot taken at purchase, so listing orders never
+    touches products.
+    """
     product = ProductSerializer(read_only=True)
-    product_id = serializers.UUIDField(write_only=True)
+    product_id = serializers.UUIDField()
+    order_id = serializers.UUIDField(write_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ["id", "order", "product", "product_id", "quantity", "unit_price", "total_price"]
-        read_only_fields = ["id", "order", "product", "unit_price", "total_price"]
+        fields = [
+            "id", "order", "order_id", "product_id", "product_title", "product_slug", "product_image_url",
+            "quantity", "unit_price", "discount_percent", "total_price", "product",
+        ]
+        read_only_fields = [
+            "id", "order", "product", "product_title", "product_slug", "product_image_url",
+            "unit_price", "discount_percent", "total_price",
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not expands_product(self.context.get("request"), self.context.get("view")):
+            fields.pop("product")
+        if self.instance is not None:
+            # only accepted when adding a line; see validate_order_id/validate_product_id
+            fields["order_id"].required = False
+            fields["product_id"].required = False
+        return fields
+
+    def validate_order_id(self, value):
+        if self.instance is not None and value != self.instance.order_id:
+            raise serializers.ValidationError("An item cannot be moved to another order.")
+        return value
+
+    def validate_product_id(self, value):
+        # the line's snapshot and stock hold belong to its product
+        if self.instance is not None and value != self.instance.product_id:
+            raise serializers.ValidationError("An item's product cannot be changed; add a new item instead.")
+        return value
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     
     order_items = serializers.ListField(
@@ -26,42 +75,83 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "user", "created_at", "updated_at", "total_amount"]
 
     def validate_order_items(self, value):
+        """
+        Shape checks only; products and stock are checked in `create` against
+        the locked product rows.
+        """
         if not value:
             raise serializers.ValidationError("Order must contain at least one item.")
-            
+
+        seen = set()
         for item in value:
             product_id = item.get('product_id')
-            quantity = item.get('quantity')
+            quantity = item.get('quantity', 1)
 
             if not product_id:
                 raise serializers.ValidationError("Each item must have a 'product_id'.")
-            
-            if not quantity or int(quantity) < 1:
+            try:
+                product_id = uuid.UUID(str(product_id))
+            except ValueError:
+                raise serializers.ValidationError(f"Product with ID {item['product_id']} does not exist.")
+            if product_id in seen:
+                raise serializers.ValidationError(f"Product {product_id} is listed more than once.")
+            seen.add(product_id)
+
+            try:
+                quantity = int(quantity)
+            except (TypeError, ValueError):
+                quantity = 0
+            if quantity < 1:
                 raise serializers.ValidationError("Quantity must be at least 1.")
 
-            if not Product.objects.filter(id=product_id).exists():
-                raise serializers.ValidationError(f"Product with ID {product_id} does not exist.")
-                
+            item['product_id'], item['quantity'] = product_id, quantity
+
         return value
 
     def create(self, validated_data):
         items_data = validated_data.pop('order_items')
-        user = validated_data.pop('user', None) 
-        
+        user = validated_data.pop('user', None)
+
         if user is None:
             user = self.context['request'].user
-    
-        order = Order.objects.create(user=user, **validated_data)
-
-        for item in items_data:
-            product = Product.objects.get(id=item['product_id'])
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item.get('quantity', 1),
-                unit_price=product.price
+
+        quantities = {item['product_id']: item['quantity'] for item in items_data}
+
+        with transaction.atomic():
+            # one query for every product, locked in primary key order so
+            # concurrent checkouts can't deadlock
+            products = {
+                product.pk: product for product in
+                Product.objects.select_for_update().filter(id__in=list(quantities)).order_by("pk")
+            }
+            available = available_to(user.pk, products.values())
+            errors = {}
+            for product_id, quantity in quantities.items():
+                product = products.get(product_id)
+                if product is None or product.is_deleted:
+                    errors[str(product_id)] = "Product does not exist."
+                elif available[product_id] < quantity:
+                    errors[str(product_id)] = "Not enough stock available."
+            if errors:
+                raise serializers.ValidationError({"order_items": errors})
+
+            items = []
+            for product_id, quantity in quantities.items():
+                item = OrderItem(quantity=quantity)
+                item.snapshot_product(products[product_id])
+                item.total_price = item.unit_price * quantity
+                items.append(item)
+            order = Order.objects.create(
+                user=user, total_amount=sum(item.total_price for item in items), **validated_data
             )
-        
-        order.update_total()
-        
-        return order
\ No newline at end of file
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+
+            # the cart's stock holds now belong to the order until it is fulfilled
+            try:
+                commit_holds(order, quantities)
+            except InsufficientStock as exc:
+                raise serializers.ValidationError({"order_items": {str(exc.product_id): "Not enough stock available."}})
+
+        return order
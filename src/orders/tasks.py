@@ -1,29 +1,87 @@
+import logging
 from celery import shared_task
 from django.db import transaction
-from django.shortcuts import get_object_or_404
-from .models import Order
-from products.models import Product
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Order, OrderItem
+from products.reservations import lock_order_holds, settle_order_holds, take_stock
 from notifications.tasks import send_order_confirmation
 
+logger = logging.getLogger(__name__)
+
+
 @shared_task
 def fulfill_order_task(order_id):
     """
-    Handles post-payment logic: stock reduction, invoice marking, 
+    Handles post-payment logic: stock reduction, invoice marking,
     and triggering notifications.
+
+    Safe to retry: the order row is locked and `fulfilled_at` claims it, so
+    a second run for the same order does nothing. Lines are taken from the
+    order's own holds plus unreserved stock; if any line is short (say its
+    hold expired and the units went to other shoppers) nothing is
+    decremented and the short lines are reported.
     """
     with transaction.atomic():
-        order = get_object_or_404(Order.objects.select_for_update(), id=order_id)
-        
-        if order.status != 'paid':
-            order.status = 'paid'
-            order.save()
+        order = Order.objects.select_for_update().filter(id=order_id).first()
+        if order is None:
+            return f"Order {order_id} does not exist."
+        if order.fulfilled_at:
+            return f"Order {order_id} already fulfilled."
+
+        lines = dict(order.items.values("product_id").annotate(qty=Sum("quantity")).values_list("product_id", "qty"))
+        short = take_stock(lines, held=lock_order_holds(order))
+        if short:
+            failed = [
+                {"item_id": str(item_id), "product_id": str(product_id), "quantity": quantity}
+                for item_id, product_id, quantity in
+                order.items.filter(product_id__in=short).values_list("id", "product_id", "quantity")
+            ]
+            transaction.set_rollback(True)
+            logger.warning("Order %s not fulfilled, not enough stock for %s", order_id, failed)
+            return {"order_id": str(order_id), "fulfilled": False, "failed_lines": failed}
+
+        order.status = Order.STATUS_PAID
+        order.fulfilled_at = timezone.now()
+        order.save(update_fields=["status", "fulfilled_at", "updated_at"])
+
+        # the units are gone from stock now, so stop holding them
+        settle_order_holds(order)
+        transaction.on_commit(lambda: send_order_confirmation.delay(str(order.id)))
+
+    return f"Order {order_id} fulfilled successfully."
 
-        for item in order.items.all():
-            product = item.product
-            if hasattr(product, 'stock'):
-                product.stock -= item.quantity
-                product.save()
 
-    send_order_confirmation.delay(str(order.id))
+def drifted_orders(queryset):
+    """Orders from `queryset` whose stored total differs from the sum of their items."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    item_totals = OrderItem.objects.filter(order=OuterRef("pk")).order_by()\
+        .values("order").annotate(total=Sum("total_price")).values("total")
+    return queryset.annotate(
+        items_total=Coalesce(Subquery(item_totals, output_field=money), Value(0), output_field=money)
+    ).exclude(total_amount=F("items_total"))
+
+
+@shared_task
+def reconcile_order_totals(limit=10000, batch_size=500):
+    """
+    Periodic check of the incrementally maintained `Order.total_amount`.
+    Drifted orders are found in one query, then corrected in batches under
+    the order row lock (the lock item writes take) with bulk_update.
+    """
+    ids = list(drifted_orders(Order.objects.order_by("pk")).values_list("pk", flat=True)[:limit])
+
+    fixed = 0
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            locked = list(Order.objects.select_for_update().filter(pk__in=ids[start:start + batch_size])
+                          .order_by("pk").values_list("pk", flat=True))
+            orders = list(drifted_orders(Order.objects.filter(pk__in=locked)).only("id", "total_amount"))
+            for order in orders:
+                order.total_amount = order.items_total
+            fixed += Order.objects.bulk_update(orders, ["total_amount"])
 
-    return f"Order {order_id} fulfilled successfully."
\ No newline at end of file
+    if fixed:
+        logger.warning("Corrected the total of %s orders", fixed)
+    return f"{fixed} order totals corrected"
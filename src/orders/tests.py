@@ -1,11 +1,16 @@
 from uuid import uuid4
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 
 from categories.models import Category
-from products.models import Product
+from products.models import Product, StockReservation
+from products.reservations import release_expired
 from orders.models import Order, OrderItem
+from orders.tasks import fulfill_order_task, reconcile_order_totals
 
 User = get_user_model()
 
@@ -58,4 +63,190 @@ class OrdersAPITestCase(APITestCase):
         self.client.force_authenticate(user=self.user)
         data = {"order_id": str(self.order2.id), "product_id": str(self.p1.id), "quantity": 1}
         resp = self.client.post("/api/order-items/", data, format="json")
-        self.assertIn(resp.status_code, (status.HTTP_403_FORBIDDEN, status.HTTP_400_BAD_REQUEST))
\ No newline at end of file
+        self.assertIn(resp.status_code, (status.HTTP_403_FORBIDDEN, status.HTTP_400_BAD_REQUEST))
+    def test_sparse_fieldsets_skip_items(self):
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.get("/api/orders/", {"fields": "id,status,total_amount"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = resp.data.get("results", resp.data)
+        self.assertEqual(set(results[0]), {"id", "status", "total_amount"})
+
+    def test_create_order_fetches_products_and_inserts_items_once(self):
+        self.client.force_authenticate(user=self.user)
+        payload = {"order_items": [
+            {"product_id": str(self.p1.id), "quantity": 2},
+            {"product_id": str(self.p2.id), "quantity": 1},
+        ]}
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post("/api/orders/", payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["total_amount"], "400.00")
+        sql = [q["sql"] for q in ctx.captured_queries]
+        inserts = [i for i, s in enumerate(sql) if s.startswith('INSERT INTO "orders_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+        # products are read once before the items go in (the rest is the response)
+        self.assertEqual(sum(s.startswith("SELECT") and 'FROM "products_product"' in s for s in sql[:inserts[0]]), 1)
+        order = Order.objects.get(pk=resp.data["id"])
+        self.assertEqual(sorted(order.items.values_list("total_price", flat=True)), [200, 200])
+
+    def test_create_order_rejects_duplicates_and_short_stock(self):
+        self.client.force_authenticate(user=self.user)
+        line = {"product_id": str(self.p2.id), "quantity": 1}
+        resp = self.client.post("/api/orders/", {"order_items": [line, line]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.post("/api/orders/", {"order_items": [
+            {"product_id": str(self.p1.id), "quantity": 1},
+            {"product_id": str(self.p2.id), "quantity": 6},
+        ]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.p2.id), resp.data["order_items"])
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_fulfillment_takes_stock_once_and_reports_short_lines(self):
+        OrderItem.objects.create(order=self.order1, product=self.p2, quantity=3, unit_price=self.p2.price)
+        self.assertEqual(fulfill_order_task(self.order1.id), f"Order {self.order1.id} fulfilled successfully.")
+        fulfill_order_task(self.order1.id)
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p1.stock, self.p2.stock), (9, 2))
+        self.order1.refresh_from_db()
+        self.assertEqual(self.order1.status, Order.STATUS_PAID)
+        self.assertIsNotNone(self.order1.fulfilled_at)
+
+        short = OrderItem.objects.create(order=self.order2, product=self.p1, quantity=20, unit_price=self.p1.price)
+        result = fulfill_order_task(self.order2.id)
+        self.assertFalse(result["fulfilled"])
+        self.assertEqual([line["item_id"] for line in result["failed_lines"]], [str(short.id)])
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.stock, 2)
+        self.order2.refresh_from_db()
+        self.assertIsNone(self.order2.fulfilled_at)
+
+    def test_item_changes_shift_total_and_drift_is_reconciled(self):
+        self.client.force_authenticate(user=self.admin)
+        order = Order.objects.create(user=self.user)
+        resp = self.client.post("/api/order-items/", {
+            "order_id": str(order.id), "product_id": str(self.p1.id), "quantity": 2,
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        item_id = resp.data["id"]
+        resp = self.client.patch(f"/api/order-items/{item_id}/", {"quantity": 3}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, 300)
+
+        # the setUp orders got their items without a total
+        Order.objects.filter(pk=order.pk).update(total_amount=1)
+        self.assertEqual(reconcile_order_totals(), "3 order totals corrected")
+        totals = dict(Order.objects.values_list("pk", "total_amount"))
+        self.assertEqual([totals[o.pk] for o in (order, self.order1, self.order2)], [300, 100, 400])
+        self.assertEqual(reconcile_order_totals(), "0 order totals corrected")
+
+        self.client.delete(f"/api/order-items/{item_id}/")
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, 0)
+
+    def test_items_keep_the_product_as_bought(self):
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.post("/api/orders/", {
+            "order_items": [{"product_id": str(self.p1.id), "quantity": 1}],
+        }, format="json")
+        order_id = resp.data["id"]
+        Product.objects.filter(pk=self.p1.pk).update(title="Renamed", price=999)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/orders/")
+        self.assertFalse(any('"products_product"' in q["sql"] for q in ctx.captured_queries))
+        order = next(row for row in resp.data["results"] if row["id"] == order_id)
+        item = order["items"][0]
+        self.assertNotIn("product", item)
+        self.assertEqual((item["product_title"], item["product_slug"], item["unit_price"]), ("Prod A", "prod-a", "100.00"))
+
+        resp = self.client.get(f"/api/orders/{order_id}/", {"expand": "product"})
+        self.assertEqual(resp.data["items"][0]["product"]["title"], "Renamed")
+        self.assertEqual(resp.data["items"][0]["product_title"], "Prod A")
+
+    def test_cannot_move_item_to_another_order_or_product(self):
+        self.client.force_authenticate(user=self.user)
+        order = Order.objects.create(user=self.user)
+        resp = self.client.post("/api/order-items/", {
+            "order_id": str(order.id), "product_id": str(self.p1.id), "quantity": 2,
+        }, format="json")
+        item_id = resp.data["id"]
+
+        resp = self.client.put(f"/api/order-items/{item_id}/", {
+            "order_id": str(self.order2.id), "product_id": str(self.p1.id), "quantity": 2,
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(OrderItem.objects.get(pk=item_id).order_id, order.id)
+        order.refresh_from_db()
+        self.order2.refresh_from_db()
+        self.assertEqual((order.total_amount, self.order2.total_amount), (200, 0))
+
+        resp = self.client.put(f"/api/order-items/{item_id}/", {
+            "product_id": str(self.p2.id), "quantity": 2,
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        item = OrderItem.objects.get(pk=item_id)
+        self.assertEqual((item.product_id, item.product_title), (self.p1.id, "Prod A"))
+
+        resp = self.client.put(f"/api/order-items/{item_id}/", {"quantity": 3}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete(f"/api/order-items/{item_id}/").status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_order_item_changes_move_the_stock_hold(self):
+        self.client.force_authenticate(user=self.admin)
+        order = Order.objects.create(user=self.user)
+        resp = self.client.post("/api/order-items/", {
+            "order_id": str(order.id), "product_id": str(self.p2.id), "quantity": 2,
+        }, format="json")
+        item_id = resp.data["id"]
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.reserved, 2)
+
+        resp = self.client.patch(f"/api/order-items/{item_id}/", {"quantity": 6}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.patch(f"/api/order-items/{item_id}/", {"quantity": 4}, format="json")
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.reserved, 4)
+
+        # units held by the order aren't on offer to other shoppers
+        self.client.force_authenticate(user=self.other)
+        resp = self.client.post("/api/orders/", {
+            "order_items": [{"product_id": str(self.p2.id), "quantity": 2}],
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.p2.id), resp.data["order_items"])
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.delete(f"/api/order-items/{item_id}/")
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.reserved, 0)
+
+    def test_fulfillment_does_not_take_units_held_by_others_after_its_hold_lapsed(self):
+        self.client.force_authenticate(user=self.admin)
+        order = Order.objects.create(user=self.user)
+        self.client.post("/api/order-items/", {
+            "order_id": str(order.id), "product_id": str(self.p2.id), "quantity": 2,
+        }, format="json")
+        StockReservation.objects.filter(order=order).update(expires_at=timezone.now())
+        release_expired()
+
+        # the released units (and the rest) are now held by another shopper
+        self.client.force_authenticate(user=self.other)
+        resp = self.client.post("/api/orders/", {
+            "order_items": [{"product_id": str(self.p2.id), "quantity": 5}],
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        result = fulfill_order_task(order.id)
+        self.assertFalse(result["fulfilled"])
+        self.assertEqual([line["product_id"] for line in result["failed_lines"]], [str(self.p2.id)])
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p2.stock, self.p2.reserved), (5, 5))
+
+        # the shopper's own order still draws on its hold
+        self.assertEqual(fulfill_order_task(resp.data["id"]), f"Order {resp.data['id']} fulfilled successfully.")
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p2.stock, self.p2.reserved), (0, 0))
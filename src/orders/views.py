@@ -10,10 +10,14 @@ from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from .tasks import fulfill_order_task
-from utils.pagination import StandardResultsSetPagination
+from utils.pagination import StandardResultsSetPagination, CursorOrPageNumberPagination
+from utils.fieldsets import SparseQuerysetMixin
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderItemSerializer
+from .serializers import OrderSerializer, OrderItemSerializer, expands_product
 from products.models import Product
+from products.reservations import InsufficientStock, hold_for_order
+from carts.stores import get_cart_store
+from carts.sync import persist_cart
 from notifications.tasks import send_order_confirmation 
 from .docs import (
     list_summary, list_description, list_responses,
@@ -24,15 +28,18 @@ from .docs import (
 )
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CursorOrPageNumberPagination
+    sparse_prefetch = {"items": ("items",)}
 
     def get_queryset(self):
-        qs = Order.objects.select_related("user").prefetch_related("items", "items__product")
+        qs = Order.objects.select_related("user")
         if getattr(self, "swagger_fake_view", False):
             return qs.none()
+        if expands_product(self.request, self):
+            qs = qs.prefetch_related("items__product__images")
         user = getattr(self.request, "user", None)
         if user is None or not getattr(user, "is_authenticated", False):
             return qs.none()
@@ -41,6 +48,10 @@ class OrderViewSet(viewsets.ModelViewSet):
         return qs.filter(user=user)
 
     def perform_create(self, serializer):
+        store = get_cart_store()
+        if store:
+            # checkout is a persistence point for the hot cart
+            persist_cart(store, self.request.user.pk)
         order = serializer.save(user=self.request.user)
         transaction.on_commit(lambda: send_order_confirmation.delay(str(order.id)))
 
@@ -95,9 +106,11 @@ class OrderItemViewSet(viewsets.ModelViewSet):
     pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
-        qs = OrderItem.objects.select_related("order", "product")
+        qs = OrderItem.objects.all()
         if getattr(self, "swagger_fake_view", False):
             return qs.none()
+        if expands_product(self.request, self):
+            qs = qs.select_related("product").prefetch_related("product__images")
         user = getattr(self.request, "user", None)
         if user is None or not getattr(user, "is_authenticated", False):
             return qs.none()
@@ -115,38 +128,46 @@ class OrderItemViewSet(viewsets.ModelViewSet):
             if not self.request.user.is_staff and order.user != self.request.user:
                 raise PermissionDenied("Cannot add items to another user's order.")
 
-            product = get_object_or_404(Product.objects.select_for_update(), pk=product_id)
-
-            if hasattr(product, "stock") and product.stock < quantity:
+            product = get_object_or_404(Product, pk=product_id)
+            try:
+                hold_for_order(order, product.pk, quantity)
+            except InsufficientStock:
                 raise ValidationError({"quantity": "Not enough stock available."})
 
-            unit_price = product.price
+            item = OrderItem(order=order, quantity=quantity)
+            item.snapshot_product(product)
+            item.save()
 
-            item = OrderItem(order=order, product=product, quantity=quantity, unit_price=unit_price)
-            item.save() 
+            order.add_to_total(item.total_price)
 
-            order.update_total()
-
-        return None
+        serializer.instance = item
 
     def perform_update(self, serializer):
         instance = serializer.instance
+        serializer.validated_data.pop("order_id", None)
+        serializer.validated_data.pop("product_id", None)
         new_quantity = serializer.validated_data.get("quantity", instance.quantity)
 
         with transaction.atomic():
             order = Order.objects.select_for_update().get(pk=instance.order_id)
 
-            if hasattr(instance.product, "stock") and instance.product.stock < new_quantity:
+            # read under the order lock: every item write takes it first
+            old_quantity, old_total = OrderItem.objects.filter(pk=instance.pk)\
+                .values_list("quantity", "total_price").get()
+            try:
+                hold_for_order(order, instance.product_id, new_quantity - old_quantity)
+            except InsufficientStock:
                 raise ValidationError({"quantity": "Not enough stock available."})
-
-            serializer.save()
-            order.update_total()
+            item = serializer.save()
+            order.add_to_total(item.total_price - old_total)
 
     def perform_destroy(self, instance):
         with transaction.atomic():
             order = Order.objects.select_for_update().get(pk=instance.order_id)
+            quantity, total = OrderItem.objects.filter(pk=instance.pk).values_list("quantity", "total_price").get()
             instance.delete()
-            order.update_total()
+            hold_for_order(order, instance.product_id, -quantity)
+            order.add_to_total(-total)
 
     @swagger_auto_schema(
         operation_summary=order_item_create_summary,
@@ -196,6 +217,7 @@ def paystack_webhook(request):
         data = json.loads(payload)
         if data['event'] == 'charge.success':
             order_id = data['data']['metadata']['order_id']
-            Order.objects.filter(id=order_id).update(status='paid')
+            # the task marks the order paid; redelivered webhooks are no-ops
+            fulfill_order_task.delay(order_id)
             
     return HttpResponse(status=200)
\ No newline at end of file
@@ -67,14 +67,64 @@ list_summary = "List products"
 list_description = (
     "Returns a paginated list of products. Supports search, filtering and ordering.\n\n"
     "**Query parameters:**\n"
-    "- `search`: full-text search against title and description\n"
+    "- `search`: full-text search against title and description, ranked by relevance "
+    "unless `ordering` is given\n"
     "- `price_min`: minimum price\n"
     "- `price_max`: maximum price\n"
     "- `category`: filter by category slug\n"
+    "- `include_descendants`: true to also match products in the category's subcategories\n"
     "- `in_stock`: true/false\n"
     "- `ordering`: comma-separated fields, e.g. `ordering=-price`\n"
+    "- `fields` / `omit`: comma-separated response fields to keep or drop, e.g. `fields=id,title,price`\n"
+    "- `expand`: include heavy fields left out of list rows, e.g. `expand=images`\n"
+    "- `image_width`: return the closest pre-generated thumbnail instead of the original, "
+    "e.g. `image_width=200`; `image_format=webp` picks WebP over JPEG\n"
+    "- `pagination`: set to `cursor` for keyset pagination; follow the `next`/`previous` links "
+    "(no `count` is returned in this mode). Not available for a `search` ranked by relevance; "
+    "pass `ordering` with `search` to page it by cursor\n"
 )
 
+suggest_summary = "Suggest products for a search prefix"
+suggest_description = (
+    "Lightweight typeahead for the storefront search box. Matches titles that start with `q` "
+    "(or contain a word starting with `q`), most popular first.\n\n"
+    "**Query parameters:**\n"
+    "- `q`: search prefix (required)\n"
+    "- `limit`: number of suggestions, default 5, max 10\n"
+    "- `image_width`: thumbnail width to return for `primary_image`\n"
+)
+suggest_parameters = [
+    openapi.Parameter(name="q", in_=openapi.IN_QUERY, description="Search prefix", type=openapi.TYPE_STRING, required=True),
+    openapi.Parameter(name="limit", in_=openapi.IN_QUERY, description="Max suggestions (1-10)", type=openapi.TYPE_INTEGER, required=False),
+]
+
+facets_summary = "Facet counts for a product listing"
+facets_description = (
+    "Accepts the same filters as the list endpoint (`search`, `category`, `include_descendants`, `price_min`, `price_max`, "
+    "`in_stock`) and returns product counts per category, per price range and by availability "
+    "for the matching products."
+)
+
+import_summary = "Bulk import products (admin only)"
+import_description = (
+    "Upload a CSV (with header row) or JSONL file as `file`. Each row needs `title`, `category` "
+    "(category slug) and `price`; `slug`, `description`, `discount_percent`, `stock` and `is_active` "
+    "are optional. Rows are inserted in batches; invalid rows are reported and skipped."
+)
+import_parameters = [
+    openapi.Parameter(name="file", in_=openapi.IN_FORM, description="CSV or JSONL file", type=openapi.TYPE_FILE, required=True),
+    openapi.Parameter(name="file_format", in_=openapi.IN_FORM, description="`csv` or `jsonl` (defaults to the file extension)", type=openapi.TYPE_STRING, required=False),
+]
+
+export_summary = "Export the catalog (admin only)"
+export_description = (
+    "Streams every non-deleted product as NDJSON (default) or CSV with the category slug joined in. "
+    "Rows are read through a server-side cursor, so the export is not paginated."
+)
+export_parameters = [
+    openapi.Parameter(name="file_format", in_=openapi.IN_QUERY, description="`ndjson` or `csv`", type=openapi.TYPE_STRING, required=False),
+]
+
 retrieve_summary = "Retrieve a product"
 retrieve_description = "Return details for a single product by ID."
 
@@ -120,6 +170,75 @@ list_responses = {
     )
 }
 
+suggest_responses = {
+    200: openapi.Response(
+        description="Product suggestions",
+        schema=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'id': openapi.Schema(type=openapi.TYPE_STRING, format='uuid'),
+                    'title': openapi.Schema(type=openapi.TYPE_STRING),
+                    'slug': openapi.Schema(type=openapi.TYPE_STRING),
+                    'primary_image': openapi.Schema(type=openapi.TYPE_STRING, format='uri', nullable=True),
+                }
+            )
+        )
+    )
+}
+
+facet_count_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={'count': openapi.Schema(type=openapi.TYPE_INTEGER)}
+)
+
+facets_responses = {
+    200: openapi.Response(
+        description="Facet counts",
+        schema=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'total': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'categories': openapi.Schema(type=openapi.TYPE_ARRAY, items=facet_count_schema),
+                'price_ranges': openapi.Schema(type=openapi.TYPE_ARRAY, items=facet_count_schema),
+                'availability': openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'in_stock': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'out_of_stock': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    }
+                ),
+            }
+        )
+    )
+}
+
+import_responses = {
+    200: openapi.Response(
+        description="Import report",
+        schema=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'rows': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'created': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'failed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'elapsed_seconds': openapi.Schema(type=openapi.TYPE_NUMBER),
+                'rows_per_second': openapi.Schema(type=openapi.TYPE_NUMBER),
+                'errors': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+            }
+        )
+    ),
+    400: openapi.Response(description="Missing or unsupported file"),
+    403: openapi.Response(description="Forbidden - admin only")
+}
+
+export_responses = {
+    200: openapi.Response(description="Streamed NDJSON or CSV file"),
+    400: openapi.Response(description="Unsupported file_format"),
+    403: openapi.Response(description="Forbidden - admin only")
+}
+
 retrieve_responses = {
     200: openapi.Response(description="Product details", schema=product_schema),
     404: openapi.Response(description="Not Found")
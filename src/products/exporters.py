@@ -0,0 +1,70 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Product
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_CHUNK_SIZE = 2000
+
+# (output column, queryset value) pairs
+EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("title", "title"),
+    ("slug", "slug"),
+    ("category", "category__slug"),
+    ("description", "description"),
+    ("price", "price"),
+    ("discount_percent", "discount_percent"),
+    ("stock", "stock"),
+    ("is_active", "is_active"),
+    ("primary_image", "primary_image_url"),
+    ("created_at", "created_at"),
+    ("updated_at", "updated_at"),
+)
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the non-deleted catalog as dicts, `chunk_size` rows at a time.
+
+    `.iterator()` uses a server-side cursor on PostgreSQL, so memory stays
+    flat regardless of catalog size.
+    """
+    rows = Product.objects.filter(is_deleted=False)\
+        .order_by()\
+        .values_list(*(source for _, source in EXPORT_COLUMNS))\
+        .iterator(chunk_size=chunk_size)
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield dict(zip(names, row))
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class _Echo:
+    """File-like object whose write() just hands back the line for streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def iter_export(file_format, chunk_size=EXPORT_CHUNK_SIZE):
+    rows = export_rows(chunk_size=chunk_size)
+    if file_format == "csv":
+        return iter_csv(rows)
+    return iter_ndjson(rows)
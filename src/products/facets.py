@@ -0,0 +1,74 @@
+from decimal import Decimal
+from django.db.models import Count, F, Q
+
+# (min, max) price ranges, min inclusive and max exclusive; None is open-ended
+PRICE_BUCKETS = (
+    (None, Decimal("50")),
+    (Decimal("50"), Decimal("100")),
+    (Decimal("100"), Decimal("500")),
+    (Decimal("500"), Decimal("1000")),
+    (Decimal("1000"), None),
+)
+
+
+def _bucket_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def compute_product_facets(queryset, buckets=PRICE_BUCKETS):
+    """
+    Category, price-range and availability counts for an already filtered
+    product queryset.
+
+    Runs a single GROUP BY category query with conditional counts for every
+    price bucket and for in-stock rows; the global totals are summed from
+    the per-category rows.
+    """
+    aggregates = {
+        "count": Count("id"),
+        # units held by carts and orders aren't on offer (see Product.available)
+        "in_stock": Count("id", filter=Q(stock__gt=F("reserved"))),
+    }
+    for index, (low, high) in enumerate(buckets):
+        aggregates[f"price_{index}"] = Count("id", filter=_bucket_q(low, high))
+
+    rows = list(
+        queryset.prefetch_related(None)
+        .order_by()
+        .values("category_id", "category__slug", "category__name")
+        .annotate(**aggregates)
+        .order_by("-count", "category__name")
+    )
+
+    total = sum(row["count"] for row in rows)
+    in_stock = sum(row["in_stock"] for row in rows)
+
+    return {
+        "total": total,
+        "categories": [
+            {
+                "id": str(row["category_id"]),
+                "slug": row["category__slug"],
+                "name": row["category__name"],
+                "count": row["count"],
+            }
+            for row in rows
+        ],
+        "price_ranges": [
+            {
+                "min": str(low) if low is not None else None,
+                "max": str(high) if high is not None else None,
+                "count": sum(row[f"price_{index}"] for row in rows),
+            }
+            for index, (low, high) in enumerate(buckets)
+        ],
+        "availability": {
+            "in_stock": in_stock,
+            "out_of_stock": total - in_stock,
+        },
+    }
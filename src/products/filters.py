@@ -1,19 +1,36 @@
+from django.db.models import F
 from django_filters import rest_framework as filters
+from categories.directory import get_category_directory
 from .models import Product
 
 class ProductFilter(filters.FilterSet):
     price_min = filters.NumberFilter(field_name="price", lookup_expr="gte")
     price_max = filters.NumberFilter(field_name="price", lookup_expr="lte")
-    category = filters.CharFilter(field_name="category__slug", lookup_expr="iexact")
+    category = filters.CharFilter(method="filter_category")
+    include_descendants = filters.BooleanFilter(method="filter_include_descendants")
     in_stock = filters.BooleanFilter(method="filter_in_stock")
 
     class Meta:
         model = Product
-        fields = ["category", "price_min", "price_max", "in_stock"]
+        fields = ["category", "include_descendants", "price_min", "price_max", "in_stock"]
+
+    def filter_category(self, queryset, name, value):
+        # slugs resolve through the in-process directory, so the product
+        # query filters on the indexed category_id without a join
+        category = get_category_directory().get(value)
+        if category is None:
+            return queryset.none()
+        if self.form.cleaned_data.get("include_descendants"):
+            return queryset.filter(category_id__in=category.subtree().values("id"))
+        return queryset.filter(category_id=category.pk)
+
+    def filter_include_descendants(self, queryset, name, value):
+        # applied by filter_category
+        return queryset
 
     def filter_in_stock(self, queryset, name, value):
         if value in (True, "true", "1"):
-            return queryset.filter(stock__gt=0)
+            return queryset.filter(stock__gt=F("reserved"))
         if value in (False, "false", "0"):
-            return queryset.filter(stock__lte=0)
+            return queryset.filter(stock__lte=F("reserved"))
         return queryset
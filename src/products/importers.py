@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import time
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from categories.directory import get_category_directory
+from utils.cache import bump_catalog_version
+from notifications.tasks import send_new_products_digest
+from .models import Product
+from .slugs import assign_slugs
+
+IMPORT_FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """Validates one import row; `category` is a category slug."""
+    title = serializers.CharField(max_length=255)
+    slug = serializers.SlugField(max_length=255, required=False, allow_blank=True)
+    category = serializers.CharField()
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    discount_percent = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, max_value=100, required=False, default=0
+    )
+    stock = serializers.IntegerField(min_value=0, required=False, default=0)
+    is_active = serializers.BooleanField(required=False, default=True)
+
+
+def guess_format(filename):
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def iter_rows(stream, file_format):
+    """
+    Yield (row_number, dict) pairs from a binary stream without loading it
+    whole. JSONL lines that fail to parse are yielded as exceptions so the
+    importer can report them per row.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "jsonl":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                yield number, exc
+    else:
+        # row 1 is the header
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, {key: value for key, value in row.items() if value not in (None, "")}
+
+
+class ProductImporter:
+    """
+    Streams rows into `Product` in `bulk_create` batches.
+
+    Categories are resolved through the category directory, slugs are
+    allocated per batch, and invalid rows are reported without aborting the
+    rest of the import. New-product notifications are coalesced into one
+    digest task sent after the import commits.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, notify=True):
+        self.batch_size = batch_size
+        self.notify = notify
+        self.categories = {
+            slug: category.pk for slug, category in get_category_directory().by_slug.items()
+        }
+        self.created_ids = []
+        self.errors = []
+        self.error_count = 0
+        self.rows = 0
+
+    def run(self, rows):
+        started = time.monotonic()
+        batch = []
+        for number, data in rows:
+            self.rows += 1
+            product = self.build(number, data)
+            if product is None:
+                continue
+            batch.append((number, product, bool(product.slug)))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+        if self.created_ids:
+            bump_catalog_version()
+            if self.notify:
+                ids = [str(pk) for pk in self.created_ids]
+                transaction.on_commit(lambda: send_new_products_digest.delay(ids))
+
+        elapsed = time.monotonic() - started
+        return {
+            "rows": self.rows,
+            "created": len(self.created_ids),
+            "failed": self.error_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed else None,
+            "errors": self.errors,
+        }
+
+    def record_error(self, number, detail):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": number, "errors": detail})
+
+    def build(self, number, data):
+        if isinstance(data, Exception):
+            self.record_error(number, {"non_field_errors": [f"Invalid JSON: {data}"]})
+            return None
+        if not isinstance(data, dict):
+            self.record_error(number, {"non_field_errors": ["Expected an object."]})
+            return None
+
+        serializer = ProductImportRowSerializer(data=data)
+        if not serializer.is_valid():
+            self.record_error(number, serializer.errors)
+            return None
+
+        values = dict(serializer.validated_data)
+        category_id = self.categories.get(values.pop("category").lower())
+        if category_id is None:
+            self.record_error(number, {"category": ["Unknown category slug."]})
+            return None
+        return Product(category_id=category_id, **values)
+
+    def flush(self, batch):
+        products = [product for _, product, _ in batch]
+        assign_slugs(products)
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+        except IntegrityError:
+            # A duplicate slug (from the file or a concurrent writer):
+            # fall back to row-by-row inserts so only the bad rows fail.
+            self.flush_rows(batch)
+            return
+        self.created_ids.extend(product.pk for product in products)
+
+    def flush_rows(self, batch):
+        for number, product, explicit_slug in batch:
+            if not explicit_slug:
+                product.slug = ""  # let Product.save allocate and retry
+            try:
+                with transaction.atomic():
+                    product.save(force_insert=True)
+            except IntegrityError as exc:
+                self.record_error(number, {"non_field_errors": [str(exc)]})
+            else:
+                self.created_ids.append(product.pk)
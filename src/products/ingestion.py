@@ -0,0 +1,158 @@
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.storage import storages
+from .models import ProductImage
+
+
+def staging_storage():
+    return storages["image_staging"]
+
+
+def stage_upload(upload):
+    """Write an uploaded file to the staging storage and return its name."""
+    name = f"{settings.PRODUCT_IMAGE_STAGING_PREFIX}/{uuid.uuid4().hex}/{os.path.basename(upload.name)}"
+    return staging_storage().save(name, upload, max_length=ProductImage._meta.get_field("staged_name").max_length)
+
+
+def hash_upload(upload):
+    """
+    SHA-256 of an uploaded file, read chunk by chunk; rewinds the file.
+    Uploads parsed by BoundedImageUploadHandler already carry it.
+    """
+    if getattr(upload, "content_hash", None):
+        return upload.content_hash
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def stored_blobs(hashes, lock=False):
+    """
+    {content_hash: (image name, variants, perceptual hash)} for hashes that
+    already have a stored blob.
+
+    With `lock`, the referencing rows are locked until the caller's
+    transaction ends. A caller about to reference a blob must lock: a
+    concurrent delete of those rows then waits for its new row to commit,
+    so delete_image_blobs sees the reference and keeps the blob.
+    """
+    hashes = {h for h in hashes if h}
+    if not hashes:
+        return {}
+    rows = ProductImage.objects.filter(content_hash__in=hashes, status=ProductImage.STATUS_READY)\
+        .exclude(image="")
+    if lock:
+        rows = rows.select_for_update().order_by("pk")
+    rows = rows.values_list("content_hash", "image", "variants", "perceptual_hash")
+    return {content_hash: blob for content_hash, *blob in rows}
+
+
+def stage_images(product, images_data):
+    """
+    Insert ProductImage rows for uploads in one query. Files whose content
+    is already stored reuse that blob and are `ready` straight away; the
+    rest are staged and inserted as `pending` for `ingest_product_images`,
+    which the caller schedules on commit.
+    """
+    uploads = []
+    for data in images_data:
+        data = dict(data)
+        upload = data.pop("image")
+        uploads.append((upload, hash_upload(upload), data))
+    # the caller inserts these rows in its own transaction, see stored_blobs
+    blobs = stored_blobs((content_hash for _, content_hash, _ in uploads), lock=True)
+
+    images = []
+    for upload, content_hash, data in uploads:
+        image = ProductImage(product=product, content_hash=content_hash, **data)
+        if content_hash in blobs:
+            image.image.name, image.variants, image.perceptual_hash = blobs[content_hash]
+            image.status = ProductImage.STATUS_READY
+        else:
+            image.status = ProductImage.STATUS_PENDING
+            image.staged_name = stage_upload(upload)
+        images.append(image)
+    return ProductImage.objects.bulk_create(images)
+
+
+def push_image(image):
+    """Upload one staged file to the image field's storage; returns the stored name."""
+    field = image._meta.get_field("image")
+    staged = staging_storage()
+    with staged.open(image.staged_name, "rb") as fh:
+        name = field.generate_filename(image, os.path.basename(image.staged_name))
+        return field.storage.save(name, fh, max_length=field.max_length)
+
+
+def requeue_failed_images(queryset):
+    """
+    Flip `failed` images that still have their staged file back to `pending`;
+    returns their ids for `ingest_product_images`.
+    """
+    ids = [str(pk) for pk in queryset.filter(status=ProductImage.STATUS_FAILED)
+           .exclude(staged_name="").values_list("id", flat=True)]
+    ProductImage.objects.filter(id__in=ids).update(status=ProductImage.STATUS_PENDING)
+    return ids
+
+
+def push_images(images, workers=None):
+    """
+    Upload staged images in parallel. Returns ({image_id: stored_name},
+    {image_id: exception}).
+    """
+    workers = workers or settings.PRODUCT_IMAGE_UPLOAD_WORKERS
+    stored, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(images)))) as pool:
+        futures = {image.pk: pool.submit(push_image, image) for image in images}
+        for pk, future in futures.items():
+            try:
+                stored[pk] = future.result()
+            except Exception as exc:
+                failed[pk] = exc
+    return stored, failed
+
+
+def discard_staged(names):
+    staged = staging_storage()
+    for name in names:
+        if name:
+            staged.delete(name)
+
+
+
+def blob_groups(rows):
+    """[[name, [variant names]], ...] from (image name, variants) pairs; JSON-safe for tasks."""
+    return [[name, [variant["name"] for variant in variants]] for name, variants in rows if name]
+
+
+def referenced_blobs(names):
+    """
+    The subset of `names` still used as an original by some ProductImage.
+    Safe to act on once the deleting transaction has committed: writers
+    that reuse a blob hold a lock on a referencing row (stored_blobs) until
+    their own reference is committed.
+    """
+    return set(ProductImage.objects.filter(image__in=list(names)).values_list("image", flat=True))
+
+
+def delete_blobs(names, workers=None):
+    """Delete blobs from the image storage in parallel. Returns {name: exception} for failures."""
+    names = list(names)
+    if not names:
+        return {}
+    storage = ProductImage._meta.get_field("image").storage
+    workers = workers or settings.PRODUCT_IMAGE_UPLOAD_WORKERS
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names)))) as pool:
+        futures = {name: pool.submit(storage.delete, name) for name in names}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as exc:
+                failed[name] = exc
+    return failed
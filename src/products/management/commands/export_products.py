@@ -0,0 +1,20 @@
+import sys
+from django.core.management.base import BaseCommand
+from products.exporters import EXPORT_FORMATS, EXPORT_CHUNK_SIZE, iter_export
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog (non-deleted products) as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--output", help="File to write; defaults to stdout")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = iter_export(options["file_format"], chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as out:
+                out.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,33 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from products.importers import (
+    IMPORT_FORMATS, DEFAULT_BATCH_SIZE, ProductImporter, guess_format, iter_rows
+)
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSONL file into the catalog in bulk batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV (with header) or JSONL file")
+        parser.add_argument("--file-format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--no-notify", action="store_true", help="Skip the new-products digest")
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"] or guess_format(options["path"])
+        try:
+            stream = open(options["path"], "rb")
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        with stream:
+            importer = ProductImporter(batch_size=options["batch_size"], notify=not options["no_notify"])
+            report = importer.run(iter_rows(stream, file_format))
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} created, {report['failed']} failed, "
+            f"{report['rows']} rows in {report['elapsed_seconds']}s ({report['rows_per_second']} rows/s)"
+        ))
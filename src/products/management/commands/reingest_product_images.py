@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from products.ingestion import requeue_failed_images
+from products.models import ProductImage
+from products.tasks import ingest_product_images
+
+
+class Command(BaseCommand):
+    help = "Queue product images that failed ingestion for another attempt."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", action="append", default=[], help="Only this product id (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=100, help="Images per ingestion task")
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.all()
+        if options["product"]:
+            images = images.filter(product_id__in=options["product"])
+        ids = requeue_failed_images(images)
+
+        size = options["batch_size"]
+        for start in range(0, len(ids), size):
+            ingest_product_images.delay(ids[start:start + size])
+
+        skipped = images.filter(status=ProductImage.STATUS_FAILED).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} images queued for ingestion, {skipped} failed images have no staged file to retry"
+        ))
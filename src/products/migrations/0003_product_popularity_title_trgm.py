@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+CREATE_TITLE_TRGM_INDEX = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX products_product_title_trgm
+    ON products_product USING gin (upper(title::text) gin_trgm_ops);
+"""
+
+DROP_TITLE_TRGM_INDEX = "DROP INDEX IF EXISTS products_product_title_trgm;"
+
+
+def create_title_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_TITLE_TRGM_INDEX)
+
+
+def drop_title_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(DROP_TITLE_TRGM_INDEX)
+
+
+def backfill_popularity(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    units_sold = (
+        OrderItem.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    Product.objects.update(popularity=Coalesce(Subquery(units_sold), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_search_vector'),
+        ('orders', '0002_alter_orderitem_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+        migrations.RunPython(create_title_trgm_index, drop_title_trgm_index),
+    ]
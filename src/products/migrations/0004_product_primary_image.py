@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+def backfill_primary_image(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductImage = apps.get_model("products", "ProductImage")
+
+    seen = set()
+    images = ProductImage.objects.order_by("product_id", "-is_primary", "-created_at")
+    for image in images.iterator(chunk_size=2000):
+        if image.product_id in seen:
+            continue
+        seen.add(image.product_id)
+        Product.objects.filter(pk=image.product_id).update(
+            primary_image_id=image.pk,
+            primary_image_url=image.image.url if image.image else "",
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_popularity_title_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_url',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_primary_image, migrations.RunPython.noop),
+    ]
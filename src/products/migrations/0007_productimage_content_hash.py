@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 import uuid
-from django.db import models
-from django.utils.text import slugify
+from django.db import models, transaction, IntegrityError
+from django.contrib.postgres.search import SearchVectorField
+from .slugs import allocate_slugs
 
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -16,11 +17,22 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     stock = models.PositiveIntegerField(default=0)
+    # Units held by active/committed StockReservations; available = stock - reserved
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.PositiveIntegerField(default=0)  # units sold, ranks suggestions
     image = models.ImageField(upload_to="products/", null=True, blank=True)
+    # Denormalized from ProductImage so list rows don't need the images; see refresh_primary_image()
+    primary_image_id = models.UUIDField(null=True, blank=True, editable=False)
+    primary_image_url = models.CharField(max_length=500, blank=True, default="", editable=False)
+    # [{"width": 320, "format": "webp", "url": ...}, ...] for list tiles
+    primary_image_variants = models.JSONField(default=list, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False) #for soft delete
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on PostgreSQL (see migration 0002),
+    # title weighted "A" and description "B". Left NULL on other backends.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
@@ -39,30 +51,46 @@ class Product(models.Model):
             models.Index(fields=["slug"]),
         ]
 
+    SLUG_ALLOCATION_ATTEMPTS = 5
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base = slugify(self.title)[:200]
-            slug = base
-            i = 0
-            while Product.objects.filter(slug=slug).exists():
-                i += 1
-                slug = f"{base}-{i}"
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
 
-    @property
-    def primary_image_url(self):
+        for attempt in range(self.SLUG_ALLOCATION_ATTEMPTS):
+            self.slug = allocate_slugs(Product, [self.title])[0]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # A concurrent insert took the slug first; allocate again.
+                # Anything else (e.g. a check constraint) is re-raised.
+                collided = Product.objects.filter(slug=self.slug).exists()
+                self.slug = ""
+                if not collided or attempt == self.SLUG_ALLOCATION_ATTEMPTS - 1:
+                    raise
 
-        all_images = self.images.all()
-        primary = next((img for img in all_images if img.is_primary), None)
+    @property
+    def available(self):
+        """Units not held by any cart or unfulfilled order (see products.reservations)."""
+        return self.stock - self.reserved
 
-        if primary and primary.image:
-            return primary.image.url
-        
-        if all_images:
-            return all_images[0].image.url
-        
-        return None
+    def refresh_primary_image(self):
+        """
+        Copy the primary image (or the latest one if none is flagged) onto
+        the product. Call after anything that changes the primary flag or
+        adds/removes images.
+        """
+        image = self.images.filter(status=ProductImage.STATUS_READY)\
+            .order_by("-is_primary", "-created_at").first()
+        self.primary_image_id = image.pk if image else None
+        self.primary_image_url = image.image.url if image and image.image else ""
+        self.primary_image_variants = image.variant_urls() if image else []
+        Product.objects.filter(pk=self.pk).update(
+            primary_image_id=self.primary_image_id,
+            primary_image_url=self.primary_image_url,
+            primary_image_variants=self.primary_image_variants,
+        )
 
     def __str__(self):
         return self.title
@@ -75,9 +103,28 @@ class ProductImage(models.Model):
         on_delete=models.CASCADE,
         related_name="images"
     )
-    image = models.ImageField(upload_to="products/images/")
+    STATUS_PENDING = "pending"
+    STATUS_READY = "ready"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_READY, "Ready"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    image = models.ImageField(upload_to="products/images/", blank=True)
     alt_text = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False)  # 
+    # Uploads are staged locally and pushed to `image` by products.tasks.ingest_product_images
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_READY)
+    staged_name = models.CharField(max_length=255, blank=True)
+    # [{"width": 320, "format": "webp", "name": "<storage name>"}, ...]; see products.thumbnails
+    variants = models.JSONField(default=list, blank=True)
+    # SHA-256 of the uploaded bytes; identical uploads share one stored blob
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # 64-bit dHash (hex) for spotting near-duplicates; see products.thumbnails
+    perceptual_hash = models.CharField(max_length=16, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -92,3 +139,76 @@ class ProductImage(models.Model):
 
     def __str__(self):
         return f"Image for {self.product.title} ({self.id})"
+
+    def variant_urls(self):
+        storage = self.image.storage
+        return [
+            {"width": v["width"], "format": v["format"], "url": storage.url(v["name"])}
+            for v in self.variants
+        ]
+
+
+class OrphanedBlob(models.Model):
+    """
+    A storage blob whose deletion kept failing; retried by
+    products.tasks.sweep_orphaned_blobs.
+    """
+    name = models.CharField(max_length=500, unique=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class StockReservation(models.Model):
+    """
+    A time-limited hold on product stock, mirrored in `Product.reserved`.
+    Cart holds are `active`; checkout commits them to an order, and
+    fulfillment turns committed holds into a real stock decrement. Expired
+    holds are released by products.tasks.release_expired_reservations.
+    See products/reservations.py.
+    """
+    STATUS_ACTIVE = "active"
+    STATUS_COMMITTED = "committed"
+    STATUS_RELEASED = "released"
+    STATUS_FULFILLED = "fulfilled"
+
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, "Active"),
+        (STATUS_COMMITTED, "Committed"),
+        (STATUS_RELEASED, "Released"),
+        (STATUS_FULFILLED, "Fulfilled"),
+    ]
+    HOLDING_STATUSES = (STATUS_ACTIVE, STATUS_COMMITTED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    user = models.ForeignKey(
+        "accounts.User", on_delete=models.CASCADE, null=True, blank=True, related_name="stock_reservations"
+    )
+    order = models.ForeignKey(
+        "orders.Order", on_delete=models.SET_NULL, null=True, blank=True, related_name="stock_reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "expires_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product"],
+                condition=models.Q(status="active"),
+                name="one_active_reservation_per_user_product"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.status})"
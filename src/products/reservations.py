@@ -0,0 +1,216 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Product, StockReservation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Not enough stock available for product {product_id}.")
+        self.product_id = product_id
+
+
+def shift_reserved(product_id, delta):
+    """
+    Move `Product.reserved` by `delta` in one conditional UPDATE; a
+    positive delta only applies while `stock - reserved` covers it.
+    """
+    if delta > 0:
+        updated = Product.objects.filter(pk=product_id, stock__gte=F("reserved") + delta)\
+            .update(reserved=F("reserved") + delta)
+        if not updated:
+            raise InsufficientStock(product_id)
+    elif delta < 0:
+        Product.objects.filter(pk=product_id).update(reserved=Greatest(F("reserved") + delta, 0))
+
+
+def take_stock(lines, held=None):
+    """
+    Decrement stock (and bump popularity) for `lines` ({product_id:
+    quantity}) where the units are free; returns the product ids that fell
+    short. `held` ({product_id: quantity}) is what the caller's own holds
+    still reserve: a line is covered by `stock - reserved + held`, so units
+    other shoppers hold are never taken once the caller's hold has lapsed.
+    The product rows are locked in primary key order first so concurrent
+    fulfillments can't deadlock. On PostgreSQL all lines go in a single
+    UPDATE ... FROM (VALUES ...).
+    """
+    if not lines:
+        return []
+    held = held or {}
+    ids = list(Product.objects.select_for_update().filter(pk__in=list(lines)).order_by("pk").values_list("pk", flat=True))
+    connection = connections[Product.objects.db]
+    if connection.vendor == "postgresql":
+        table = Product._meta.db_table
+        values = ", ".join(["(%s::uuid, %s::integer, %s::integer)"] * len(ids))
+        params = [value for pk in ids for value in (pk, lines[pk], held.get(pk, 0))]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} AS p SET stock = p.stock - v.qty, popularity = p.popularity + v.qty "
+                f"FROM (VALUES {values}) AS v(id, qty, held) "
+                f"WHERE p.id = v.id AND p.stock - p.reserved + v.held >= v.qty RETURNING p.id",
+                params,
+            )
+            taken = {row[0] for row in cursor.fetchall()}
+    else:
+        taken = {
+            pk for pk in ids
+            if Product.objects.filter(pk=pk, stock__gte=F("reserved") - held.get(pk, 0) + lines[pk])
+            .update(stock=F("stock") - lines[pk], popularity=F("popularity") + lines[pk])
+        }
+    return [product_id for product_id in lines if product_id not in taken]
+
+
+def cart_hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+
+def order_hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_ORDER_TTL)
+
+
+def hold_for_cart(user_id, product_id, quantity):
+    """
+    Set the user's active hold on a product to `quantity` (0 releases it) and
+    push its expiry out. Raises InsufficientStock when the extra units aren't
+    available. Only the user's own reservation row is locked; the product row
+    is touched by a single UPDATE at the end of a short transaction.
+    """
+    with transaction.atomic():
+        hold = StockReservation.objects.select_for_update()\
+            .filter(user_id=user_id, product_id=product_id, status=StockReservation.STATUS_ACTIVE).first()
+        held = hold.quantity if hold else 0
+        # a hold that already expired no longer counts, the sweeper releases it
+        if hold and hold.expires_at <= timezone.now():
+            release_holds([hold])
+            hold, held = None, 0
+
+        if quantity <= 0:
+            if hold:
+                release_holds([hold])
+            return None
+
+        shift_reserved(product_id, quantity - held)
+        if hold is None:
+            hold = StockReservation(user_id=user_id, product_id=product_id)
+        hold.quantity = quantity
+        hold.expires_at = cart_hold_expiry()
+        hold.save()
+        return hold
+
+
+def hold_for_order(order, product_id, quantity):
+    """
+    Grow (or with a negative `quantity`, shrink) the order's committed hold
+    on a product; used for staff-built orders. Raises InsufficientStock.
+    """
+    with transaction.atomic():
+        hold = StockReservation.objects.select_for_update().filter(
+            order=order, product_id=product_id, status=StockReservation.STATUS_COMMITTED
+        ).first()
+        if quantity < 0:
+            # only give back what the order still holds; an expired hold was already released
+            quantity = max(quantity, -hold.quantity) if hold else 0
+        shift_reserved(product_id, quantity)
+        if hold is None:
+            if quantity <= 0:
+                return None
+            hold = StockReservation(product_id=product_id, user_id=order.user_id, order=order,
+                                    quantity=0, status=StockReservation.STATUS_COMMITTED)
+        hold.quantity += quantity
+        if hold.quantity <= 0:
+            hold.quantity = 0
+            hold.status = StockReservation.STATUS_RELEASED
+        hold.expires_at = order_hold_expiry()
+        hold.save()
+        return hold
+
+
+def held_by(user_id, product_ids):
+    """The user's active cart holds, {product_id: quantity}."""
+    return dict(StockReservation.objects.filter(
+        user_id=user_id, product_id__in=list(product_ids), status=StockReservation.STATUS_ACTIVE
+    ).values_list("product_id", "quantity"))
+
+
+def available_to(user_id, products):
+    """
+    Units of each product the user can hold, {product_id: units}: stock not
+    reserved by anyone else (the user's own cart hold counts as available).
+    """
+    held = held_by(user_id, [product.pk for product in products])
+    return {product.pk: product.available + held.get(product.pk, 0) for product in products}
+
+
+def commit_holds(order, lines):
+    """
+    Checkout: make sure the order's user holds `lines` ({product_id:
+    quantity}) and bind those holds to the order. Missing or expired cart
+    holds are re-acquired, in product id order. Raises InsufficientStock.
+    """
+    for product_id in sorted(lines, key=str):
+        hold_for_cart(order.user_id, product_id, lines[product_id])
+    StockReservation.objects.filter(
+        user_id=order.user_id, product_id__in=list(lines), status=StockReservation.STATUS_ACTIVE
+    ).update(status=StockReservation.STATUS_COMMITTED, order=order, expires_at=order_hold_expiry())
+
+
+def release_holds(holds):
+    """Release holding reservations: one `reserved` UPDATE per product, in product id order."""
+    holds = [hold for hold in holds if hold.status in StockReservation.HOLDING_STATUSES]
+    if not holds:
+        return 0
+    per_product = defaultdict(int)
+    for hold in holds:
+        per_product[hold.product_id] += hold.quantity
+    for product_id in sorted(per_product, key=str):
+        shift_reserved(product_id, -per_product[product_id])
+    StockReservation.objects.filter(pk__in=[hold.pk for hold in holds])\
+        .update(status=StockReservation.STATUS_RELEASED)
+    for hold in holds:
+        hold.status = StockReservation.STATUS_RELEASED
+    return len(holds)
+
+
+def release_user_holds(user_id):
+    with transaction.atomic():
+        holds = list(StockReservation.objects.select_for_update()
+                     .filter(user_id=user_id, status=StockReservation.STATUS_ACTIVE))
+        return release_holds(holds)
+
+
+def release_expired(limit=1000):
+    """Release up to `limit` expired holds; rows locked by a concurrent run are skipped."""
+    with transaction.atomic():
+        holds = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(status__in=StockReservation.HOLDING_STATUSES, expires_at__lte=timezone.now())
+            .order_by("expires_at")[:limit]
+        )
+        return release_holds(holds)
+
+
+def lock_order_holds(order):
+    """
+    Lock the order's committed holds, so the expiry sweeper skips them, and
+    return what they reserve, {product_id: quantity}.
+    """
+    held = defaultdict(int)
+    for product_id, quantity in StockReservation.objects.select_for_update().filter(
+        order=order, status=StockReservation.STATUS_COMMITTED
+    ).values_list("product_id", "quantity"):
+        held[product_id] += quantity
+    return dict(held)
+
+
+def settle_order_holds(order):
+    """After fulfillment decremented stock: drop the order's committed holds from `reserved`."""
+    holds = list(StockReservation.objects.select_for_update()
+                 .filter(order=order, status=StockReservation.STATUS_COMMITTED))
+    release_holds(holds)
+    StockReservation.objects.filter(pk__in=[hold.pk for hold in holds])\
+        .update(status=StockReservation.STATUS_FULFILLED)
@@ -0,0 +1,40 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Full-text search over `Product.search_vector` on PostgreSQL.
+
+    Results are ranked by relevance unless the client asked for an explicit
+    `ordering`. On other backends (SQLite in tests) it falls back to DRF's
+    `icontains` search over the view's `search_fields`.
+
+    Must be listed after `OrderingFilter` so the rank ordering isn't replaced
+    by the view's default ordering.
+    """
+    search_config = "english"
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        if connections[queryset.db].vendor != "postgresql":
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(
+            " ".join(search_terms),
+            config=self.search_config,
+            search_type="websearch",
+        )
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F("search_vector"), query)
+        )
+
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by("-search_rank", *queryset.query.order_by)
@@ -1,6 +1,10 @@
 from django.db import transaction
 from rest_framework import serializers
+from utils.fieldsets import SparseFieldsetsMixin
 from .models import Product, ProductImage
+from .ingestion import blob_groups, stage_images
+from .tasks import delete_image_blobs, ingest_product_images
+from .thumbnails import closest_variant, requested_variant, srcset
 
 
 class EmptySerializer(serializers.Serializer):
@@ -15,19 +19,63 @@ class ProductImageCreateSerializer(serializers.ModelSerializer):
         model = ProductImage
         fields = ("image", "alt_text", "is_primary")
 
+def sized_image_url(serializer, url, variants):
+    """The variant closest to `?image_width=` if one was requested, else `url`."""
+    wanted = requested_variant(serializer.context.get("request"))
+    if wanted and variants:
+        variant = closest_variant(variants, *wanted)
+        if variant:
+            return variant["url"]
+    return url or None
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
+    """
+    `variants` lists the pre-generated thumbnails and `srcset` is ready for
+    an <img> tag. With `?image_width=` (and optionally `?image_format=webp`)
+    `image_url` points at the closest variant and the variant lists are left
+    out.
+    """
     image_url = serializers.SerializerMethodField(read_only=True)
+    variants = serializers.SerializerMethodField(read_only=True)
+    srcset = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = ProductImage
-        fields = ("id", "image_url", "alt_text", "is_primary", "created_at")
-        read_only_fields = ("id", "image_url", "created_at")
+        fields = ("id", "image_url", "variants", "srcset", "alt_text", "is_primary", "status", "created_at")
+        read_only_fields = ("id", "image_url", "variants", "srcset", "status", "created_at")
 
     def get_image_url(self, obj):
-        return obj.image.url if obj.image else None
+        return sized_image_url(self, obj.image.url if obj.image else None, obj.variant_urls())
+
+    def get_variants(self, obj):
+        return obj.variant_urls()
+
+    def get_srcset(self, obj):
+        return srcset(obj.variant_urls()) or None
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if requested_variant(self.context.get("request")):
+            data.pop("variants", None)
+            data.pop("srcset", None)
+        return data
 
-class ProductSerializer(serializers.ModelSerializer):
+
+class ProductSuggestionSerializer(serializers.ModelSerializer):
+    """Minimal payload for the search-box typeahead."""
+    primary_image = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ("id", "title", "slug", "primary_image")
+        read_only_fields = fields
+
+    def get_primary_image(self, obj):
+        return sized_image_url(self, obj.primary_image_url, obj.primary_image_variants)
+
+
+class ProductSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     primary_image = serializers.SerializerMethodField(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     images_upload = ProductImageCreateSerializer(many=True, write_only=True, required=False)
@@ -59,7 +107,7 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "slug", "primary_image", "images", "created_at", "updated_at"]
 
     def get_primary_image(self, obj):
-        return obj.primary_image_url
+        return sized_image_url(self, obj.primary_image_url, obj.primary_image_variants)
 
     def create(self, validated_data):
         images_data = validated_data.pop("images_upload", [])
@@ -79,37 +127,43 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def _handle_images_ops(self, product, images_upload_data, images_delete_uuids):
         """Orchestrates image creation, deletion, and primary flag updates."""
-        created_imgs = []
-        
+        if any(img.get("is_primary") for img in images_upload_data or []):
+            # A new image is primary: unset the others before inserting it,
+            # the partial unique constraint allows one primary per product
+            ProductImage.objects.filter(product=product, is_primary=True).update(is_primary=False)
         if images_upload_data:
-            created_imgs = self._create_images(product, images_upload_data)
+            self._create_images(product, images_upload_data)
         if images_delete_uuids:
             self._delete_images_by_ids(product, images_delete_uuids)
-        if any(getattr(i, "is_primary", False) for i in created_imgs):
-            # If a new image is primary, unset others
-            primary_ids = [i.pk for i in created_imgs if i.is_primary]
-            ProductImage.objects.filter(product=product).exclude(pk__in=primary_ids).update(is_primary=False)
         self._ensure_primary_after_deletion(product)
 
     def _create_images(self, product, images_data):
-        created_images = []
-        for img in images_data:
-            instance = ProductImage.objects.create(product=product, **img)
-            created_images.append(instance)
+        """
+        Stage the uploads and insert them as `pending`; the storage upload
+        happens in `ingest_product_images` once the transaction commits.
+        """
+        created_images = stage_images(product, images_data)
+        image_ids = [str(img.pk) for img in created_images if img.status == ProductImage.STATUS_PENDING]
+        if image_ids:
+            transaction.on_commit(lambda: ingest_product_images.delay(image_ids))
         return created_images
 
     def _delete_images_by_ids(self, product, uuids):
+        """
+        Delete the rows in one query; their storage blobs are removed by a
+        task once the transaction commits.
+        """
         if not uuids:
             return
-        
+
         to_delete_qs = ProductImage.objects.filter(product=product, id__in=uuids)
-        for inst in to_delete_qs:
-            if inst.image:
-                try:
-                    inst.image.delete(save=False)
-                except Exception:
-                    pass 
-            inst.delete()
+        rows = list(to_delete_qs.values_list("image", "variants", "staged_name"))
+        groups = blob_groups((image, variants) for image, variants, _ in rows)
+        # images deleted before ingestion only have their staged upload
+        staged = [name for _, _, name in rows if name]
+        to_delete_qs.delete()
+        if groups or staged:
+            transaction.on_commit(lambda: delete_image_blobs.delay(groups, staged))
 
     def _ensure_primary_after_deletion(self, product):
         """If no primary image exists, set the latest one as primary."""
@@ -117,4 +171,16 @@ class ProductSerializer(serializers.ModelSerializer):
             latest = product.images.order_by("-created_at").first()
             if latest:
                 latest.is_primary = True
-                latest.save(update_fields=["is_primary"])
\ No newline at end of file
+                latest.save(update_fields=["is_primary"])
+        product.refresh_primary_image()
+
+
+class ProductListSerializer(ProductSerializer):
+    """
+    List rows carry only the denormalized `primary_image` thumbnail, so the
+    list endpoint doesn't need to prefetch every ProductImage. Clients that
+    want the gallery can still ask for `?expand=images`.
+    """
+
+    class Meta(ProductSerializer.Meta):
+        expandable_fields = ("images",)
\ No newline at end of file
@@ -0,0 +1,75 @@
+from collections import defaultdict
+from django.db.models import Q
+from django.utils.text import slugify
+
+SLUG_BASE_LENGTH = 200
+# Bases per lookup query; keeps the OR list of prefix scans bounded
+SLUG_QUERY_BATCH = 500
+
+
+def slug_base(title):
+    return slugify(title)[:SLUG_BASE_LENGTH] or "product"
+
+
+def _used_slugs(model, bases):
+    """
+    Fetch the existing slugs equal to a base or starting with `base-`.
+
+    One query per batch of bases, `slug = base OR slug LIKE 'base-%'`, which
+    PostgreSQL serves from the pattern-ops index on the unique slug column.
+    Returns the slugs plus, per base, the numeric suffixes already taken
+    (0 for the bare base).
+    """
+    slugs = set()
+    suffixes = defaultdict(set)
+    bases = list(bases)
+    for start in range(0, len(bases), SLUG_QUERY_BATCH):
+        batch = set(bases[start:start + SLUG_QUERY_BATCH])
+        q = Q()
+        for base in batch:
+            q |= Q(slug=base) | Q(slug__startswith=f"{base}-")
+
+        for slug in model.objects.filter(q).values_list("slug", flat=True).iterator():
+            slugs.add(slug)
+            if slug in batch:
+                suffixes[slug].add(0)
+            head, _, tail = slug.rpartition("-")
+            if head in batch and tail.isdigit():
+                suffixes[head].add(int(tail))
+    return slugs, suffixes
+
+
+def allocate_slugs(model, titles):
+    """
+    Return a unique slug for each title, in order.
+
+    The bare base is used when free; otherwise titles sharing a base get
+    suffixes continuing from the highest one already in the table. Callers must
+    still handle an IntegrityError from a concurrent insert and retry.
+    """
+    bases = [slug_base(title) for title in titles]
+    taken, suffixes = _used_slugs(model, set(bases))
+
+    slugs = []
+    for base in bases:
+        used = suffixes[base]
+        suffix = max(used) + 1 if 0 in used else 0
+        slug = f"{base}-{suffix}" if suffix else base
+        # another base in this batch may already have produced this slug
+        while slug in taken:
+            suffix += 1
+            slug = f"{base}-{suffix}"
+        used.add(suffix)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def assign_slugs(instances):
+    """Fill in `slug` on every instance that doesn't have one yet."""
+    pending = [obj for obj in instances if not obj.slug]
+    if not pending:
+        return
+    model = type(pending[0])
+    for obj, slug in zip(pending, allocate_slugs(model, [obj.title for obj in pending])):
+        obj.slug = slug
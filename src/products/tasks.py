@@ -0,0 +1,172 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from utils.cache import bump_catalog_version
+from .models import OrphanedBlob, Product, ProductImage
+from .ingestion import (
+    delete_blobs, discard_staged, push_images, referenced_blobs, staging_storage, stored_blobs,
+)
+from .reservations import release_expired
+from .thumbnails import generate_variants, perceptual_hash
+
+logger = logging.getLogger(__name__)
+
+BLOB_DELETE_BATCH = 100
+
+
+@shared_task(bind=True, max_retries=3)
+def ingest_product_images(self, image_ids):
+    """
+    Push staged product images to the media storage in parallel, flip them
+    to `ready` and recompute each product's primary image. Images whose
+    content is already stored (or appears twice in the batch) reuse that
+    blob instead of being uploaded again. Failed uploads are retried, then
+    marked `failed`.
+    """
+    images = list(ProductImage.objects.filter(id__in=image_ids, status=ProductImage.STATUS_PENDING))
+    if not images:
+        return "no_pending_images"
+
+    blobs = stored_blobs(image.content_hash for image in images)
+    uploads, seen = [], set()
+    for image in images:
+        if not image.content_hash or (image.content_hash not in blobs and image.content_hash not in seen):
+            uploads.append(image)
+            seen.add(image.content_hash)
+    stored, failed = push_images(uploads)
+
+    for image in uploads:
+        if image.pk in stored:
+            image.image.name = stored[image.pk]
+            process_original(image)
+            if image.content_hash:
+                blobs[image.content_hash] = (image.image.name, image.variants, image.perceptual_hash)
+
+    ready, reused = [], []
+    for image in images:
+        if image.pk in stored:
+            ready.append(image)
+        elif image.pk not in failed and image.content_hash in blobs:
+            ready.append(image)
+            reused.append(image)
+        elif image.pk not in failed:
+            # its upload twin failed; retry it along with that one
+            failed[image.pk] = None
+
+    with transaction.atomic():
+        # blobs found before the uploads may have been deleted since; check
+        # again under lock (see stored_blobs) and retry images that lost theirs
+        pushed = {image.content_hash for image in uploads if image.pk in stored}
+        existing = stored_blobs({image.content_hash for image in reused} - pushed, lock=True)
+        for image in reused:
+            blob = blobs[image.content_hash] if image.content_hash in pushed else existing.get(image.content_hash)
+            if blob is None:
+                ready.remove(image)
+                failed[image.pk] = None
+            else:
+                image.image.name, image.variants, image.perceptual_hash = blob
+        for image in ready:
+            image.status = ProductImage.STATUS_READY
+        duplicates = len(ready) - len(stored)
+
+        ProductImage.objects.bulk_update(ready, ["image", "status", "variants", "perceptual_hash"])
+        for product in Product.objects.filter(id__in={image.product_id for image in images}):
+            product.refresh_primary_image()
+        bump_catalog_version()
+
+    discard_staged(image.staged_name for image in ready)
+    ProductImage.objects.filter(id__in=[image.pk for image in ready]).update(staged_name="")
+
+    if failed:
+        failed_ids = [str(pk) for pk in failed]
+        if self.request.retries < self.max_retries:
+            raise self.retry(args=[failed_ids], countdown=2 ** self.request.retries * 5)
+        for pk, exc in failed.items():
+            logger.error("Product image %s failed to upload: %s", pk, exc)
+        ProductImage.objects.filter(id__in=failed).update(status=ProductImage.STATUS_FAILED)
+
+    return f"{len(stored)} images ingested, {duplicates} deduplicated, {len(failed)} failed"
+
+
+def process_original(image):
+    """
+    Fill in thumbnail variants and the perceptual hash from the staged
+    original; an image without them still serves.
+    """
+    try:
+        with staging_storage().open(image.staged_name, "rb") as fh:
+            data = fh.read()
+        image.variants = generate_variants(image, data)
+        if settings.PRODUCT_IMAGE_PERCEPTUAL_HASH:
+            image.perceptual_hash = perceptual_hash(data)
+    except Exception:
+        logger.exception("Could not process product image %s", image.pk)
+
+
+@shared_task(bind=True, max_retries=3)
+def delete_image_blobs(self, groups, staged=()):
+    """
+    Remove the blobs of deleted product images from storage, in batches.
+
+    `groups` is `[[original, [variant, ...]], ...]` (see
+    ingestion.blob_groups). Originals another image still references
+    (deduplicated uploads) are kept. Failures are retried, then recorded as
+    OrphanedBlob rows for `sweep_orphaned_blobs`. `staged` names the staged
+    uploads of images deleted before they were ingested.
+    """
+    for name in staged:
+        try:
+            discard_staged([name])
+        except Exception as exc:
+            logger.error("Could not discard staged product image %s: %s", name, exc)
+
+    in_use = referenced_blobs(name for name, _ in groups)
+    names = [blob for name, variants in groups if name not in in_use for blob in [name, *variants]]
+
+    failed = {}
+    for start in range(0, len(names), BLOB_DELETE_BATCH):
+        failed.update(delete_blobs(names[start:start + BLOB_DELETE_BATCH]))
+
+    if failed:
+        if self.request.retries < self.max_retries:
+            raise self.retry(args=[[[name, []] for name in failed]], countdown=2 ** self.request.retries * 5)
+        for name, exc in failed.items():
+            logger.error("Could not delete product image blob %s: %s", name, exc)
+        OrphanedBlob.objects.bulk_create(
+            [OrphanedBlob(name=name, attempts=1, last_error=str(exc)) for name, exc in failed.items()],
+            ignore_conflicts=True,
+        )
+
+    return f"{len(names) - len(failed)} blobs deleted, {len(failed)} orphaned"
+
+
+@shared_task
+def sweep_orphaned_blobs(limit=500):
+    """Periodic retry of blob deletions that `delete_image_blobs` gave up on."""
+    orphans = list(OrphanedBlob.objects.order_by("updated_at")[:limit])
+    if not orphans:
+        return "no_orphaned_blobs"
+
+    in_use = referenced_blobs(orphan.name for orphan in orphans)
+    failed = delete_blobs(orphan.name for orphan in orphans if orphan.name not in in_use)
+
+    retry = [orphan for orphan in orphans if orphan.name in failed]
+    now = timezone.now()
+    for orphan in retry:
+        orphan.attempts += 1
+        orphan.last_error = str(failed[orphan.name])
+        # bulk_update skips auto_now; moving it sends the orphan to the back of the queue
+        orphan.updated_at = now
+    OrphanedBlob.objects.bulk_update(retry, ["attempts", "last_error", "updated_at"])
+    OrphanedBlob.objects.filter(pk__in=[o.pk for o in orphans if o.name not in failed]).delete()
+
+    return f"{len(orphans) - len(retry)} orphaned blobs cleared, {len(retry)} still failing"
+
+
+@shared_task
+def release_expired_reservations(limit=1000):
+    """Periodic release of stock holds whose cart or checkout went quiet."""
+    released = release_expired(limit)
+    return f"{released} stock reservations released"
@@ -1,13 +1,44 @@
+import hashlib
+import io
+import json
+import tempfile
+from urllib.parse import parse_qs, urlparse
 from uuid import uuid4
+from PIL import Image
+from django.db import connection
+from django.db.models import F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 
+from categories.directory import get_category_directory
 from categories.models import Category
-from products.models import Product
+from products.models import OrphanedBlob, Product, ProductImage
+from products.ingestion import blob_groups, requeue_failed_images, stage_images, staging_storage
+from products.slugs import allocate_slugs
+from utils.cache import bump_catalog_version
+from products.tasks import delete_image_blobs, ingest_product_images, sweep_orphaned_blobs
 
 User = get_user_model()
 
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "image_staging": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": tempfile.mkdtemp(prefix="staging-")},
+    },
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def make_image_upload(name="photo.png", size=(64, 48), color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
 
 class ProductAPITestCase(APITestCase):
     def setUp(self):
@@ -98,6 +129,17 @@ class ProductAPITestCase(APITestCase):
             self.assertGreaterEqual(price, 1000.0)
             self.assertLessEqual(price, 2000.0)
 
+    def test_filter_by_category_subtree(self):
+        laptops = Category.objects.create(name="Laptops", slug="laptops", parent=self.cat_electronics)
+        Product.objects.filter(slug="budget-laptop").update(category=laptops)
+
+        response = self.client.get(self.list_url, {"category": "Electronics"})
+        self.assertEqual(response.data["count"], 2)
+        response = self.client.get(self.list_url, {"category": "electronics", "include_descendants": "true"})
+        self.assertEqual(response.data["count"], 3)
+        response = self.client.get(self.list_url, {"category": "laptops", "include_descendants": "true"})
+        self.assertEqual([p["slug"] for p in response.data["results"]], ["budget-laptop"])
+
     def test_filter_by_category_slug(self):
         response = self.client.get(self.list_url, {"category": "electronics"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -155,4 +197,410 @@ class ProductAPITestCase(APITestCase):
         
         resp = self.client.get(self.list_url)
         ids = [r["id"] for r in resp.data["results"]]
-        self.assertNotIn(str(product.id), ids)
\ No newline at end of file
+        self.assertNotIn(str(product.id), ids)
+    def test_cursor_pagination_walks_all_products(self):
+        seen = []
+        response = self.client.get(self.list_url, {"pagination": "cursor", "page_size": 3})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(p["id"] for p in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_cursor_pagination_seeks_past_rows_sharing_a_timestamp(self):
+        Product.objects.update(created_at=Product.objects.first().created_at)
+        seen = []
+        response = self.client.get(self.list_url, {"pagination": "cursor", "page_size": 1})
+        while response.data["next"]:
+            seen.extend(p["id"] for p in response.data["results"])
+            response = self.client.get(response.data["next"])
+        seen.extend(p["id"] for p in response.data["results"])
+        self.assertEqual(len(set(seen)), 4)
+
+        previous = self.client.get(response.data["previous"])
+        self.assertEqual([p["id"] for p in previous.data["results"]], [seen[-2]])
+
+    def test_cursor_pagination_requires_ordering_with_search(self):
+        response = self.client.get(self.list_url, {"pagination": "cursor", "search": "laptop"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.list_url, {"pagination": "cursor", "search": "laptop", "ordering": "-price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cursor_pagination_rejects_cursor_from_another_ordering(self):
+        response = self.client.get(self.list_url, {"pagination": "cursor", "page_size": 1})
+        cursor = parse_qs(urlparse(response.data["next"]).query)["cursor"][0]
+        response = self.client.get(self.list_url, {"cursor": cursor, "ordering": "price"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.list_url, {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cursor_pagination_rejects_unsigned_cursor(self):
+        # base64 of "p=2026-01-01", i.e. a plain DRF cursor without a signature
+        response = self.client.get(self.list_url, {"cursor": "cD0yMDI2LTAxLTAx"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_combines_with_product_filter(self):
+        response = self.client.get(self.list_url, {"search": "laptop", "category": "electronics"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = {p["title"] for p in response.data["results"]}
+        self.assertEqual(titles, {"MacBook Pro 14", "Budget Laptop"})
+
+    def test_suggest_returns_prefix_matches_by_popularity(self):
+        Product.objects.filter(slug="budget-laptop").update(popularity=5)
+        Product.objects.create(
+            title="Mac Mini",
+            slug="mac-mini",
+            category=self.cat_electronics,
+            price=600.00,
+            stock=3,
+            popularity=9,
+        )
+
+        response = self.client.get(f"{self.list_url}suggest/", {"q": "mac"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p["title"] for p in response.data], ["Mac Mini", "MacBook Pro 14"])
+        self.assertEqual(set(response.data[0]), {"id", "title", "slug", "primary_image"})
+
+        response = self.client.get(f"{self.list_url}suggest/", {"q": "lap"})
+        self.assertEqual([p["title"] for p in response.data], ["Budget Laptop"])
+
+    def test_anonymous_list_is_cached_until_catalog_changes(self):
+        first = self.client.get(self.list_url, {"ordering": "price"})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.list_url, {"ordering": "price"})
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(second.data, first.data)
+
+        Product.objects.create(
+            title="Cheap Cable",
+            slug="cheap-cable",
+            category=self.cat_electronics,
+            price=5.00,
+            stock=100,
+        )
+        third = self.client.get(self.list_url, {"ordering": "price"})
+        self.assertEqual(third.data["results"][0]["title"], "Cheap Cable")
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_URL="/media/", MEDIA_ROOT=tempfile.mkdtemp())
+    def test_uploaded_images_are_ingested_asynchronously(self):
+        self.client.force_authenticate(user=self.admin)
+        data = {
+            "title": "Camera",
+            "category": str(self.cat_electronics.id),
+            "price": "450.00",
+            "stock": 3,
+            "images_upload[0]image": make_image_upload("front.png"),
+            "images_upload[0]is_primary": True,
+            "images_upload[1]image": make_image_upload("back.png", color="blue"),
+        }
+        response = self.client.post(self.list_url, data, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual({img["status"] for img in response.data["images"]}, {"pending"})
+        self.assertIsNone(response.data["primary_image"])
+
+        product = Product.objects.get(pk=response.data["id"])
+        ingest_product_images([str(pk) for pk in product.images.values_list("pk", flat=True)])
+
+        images = list(product.images.all())
+        self.assertTrue(all(img.status == ProductImage.STATUS_READY for img in images))
+        self.assertTrue(all(img.image.storage.exists(img.image.name) for img in images))
+        front = product.images.get(is_primary=True)
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_id, front.pk)
+        self.assertTrue(product.primary_image_url.startswith("/media/products/images/front"))
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_URL="/media/", MEDIA_ROOT=tempfile.mkdtemp())
+    def test_failed_staged_images_can_be_requeued(self):
+        product = Product.objects.get(slug="dell-xps-13")
+        image = stage_images(product, [{"image": make_image_upload("side.png")}])[0]
+        self.assertTrue(image.staged_name.startswith("staging/product-images/"))
+        staged = image.staged_name
+        ProductImage.objects.filter(pk=image.pk).update(status=ProductImage.STATUS_FAILED)
+
+        self.assertEqual(requeue_failed_images(ProductImage.objects.all()), [str(image.pk)])
+        ingest_product_images([str(image.pk)])
+
+        image.refresh_from_db()
+        self.assertEqual((image.status, image.staged_name), (ProductImage.STATUS_READY, ""))
+        self.assertFalse(staging_storage().exists(staged))
+        self.assertEqual(requeue_failed_images(ProductImage.objects.all()), [])
+
+    @override_settings(
+        STORAGES={**LOCAL_STORAGES, "image_staging": LOCAL_STORAGES["default"]},
+        MEDIA_URL="/media/", MEDIA_ROOT=tempfile.mkdtemp(),
+    )
+    def test_deleting_pending_images_discards_their_staged_upload(self):
+        product = Product.objects.get(slug="dell-xps-13")
+        first, second = stage_images(product, [
+            {"image": make_image_upload("a.png")},
+            {"image": make_image_upload("b.png", color="blue")},
+        ])
+        storage = first.image.storage
+        self.client.force_authenticate(user=self.admin)
+
+        with self.captureOnCommitCallbacks():
+            self.client.patch(
+                f"{self.list_url}{product.id}/", {"images_delete": [str(first.pk)]}, format="multipart"
+            )
+            self.client.delete(f"/api/product-images/{second.pk}/")
+        self.assertFalse(ProductImage.objects.filter(pk__in=[first.pk, second.pk]).exists())
+        self.assertTrue(storage.exists(first.staged_name))
+
+        delete_image_blobs([], [first.staged_name, second.staged_name])
+        self.assertFalse(storage.exists(first.staged_name))
+        self.assertFalse(storage.exists(second.staged_name))
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_URL="/media/", MEDIA_ROOT=tempfile.mkdtemp())
+    def test_ingestion_generates_thumbnail_variants(self):
+        product = Product.objects.get(slug="dell-xps-13")
+        image = stage_images(product, [{"image": make_image_upload("wide.png", size=(800, 600)), "is_primary": True}])[0]
+        ingest_product_images([str(image.pk)])
+
+        image.refresh_from_db()
+        self.assertEqual(
+            sorted((v["width"], v["format"]) for v in image.variants),
+            [(w, f) for w in (160, 320, 640) for f in ("jpeg", "webp")],
+        )
+        with image.image.storage.open(image.variants[0]["name"]) as fh:
+            self.assertEqual(Image.open(fh).width, image.variants[0]["width"])
+
+        response = self.client.get(f"{self.list_url}{product.id}/")
+        data = response.data["images"][0]
+        self.assertEqual(len(data["variants"]), 6)
+        self.assertRegex(data["srcset"], r"_160w\.jpg 160w, .*_320w\.jpg 320w, .*_640w\.jpg 640w$")
+
+        response = self.client.get(self.list_url, {"search": "Dell", "image_width": 200, "image_format": "webp"})
+        self.assertTrue(response.data["results"][0]["primary_image"].endswith("_320w.webp"))
+        response = self.client.get(f"{self.list_url}{product.id}/", {"image_width": 2000})
+        data = response.data["images"][0]
+        self.assertTrue(data["image_url"].endswith("_640w.jpg"))
+        self.assertNotIn("srcset", data)
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_URL="/media/", MEDIA_ROOT=tempfile.mkdtemp())
+    def test_identical_uploads_share_one_blob(self):
+        product = Product.objects.get(slug="dell-xps-13")
+        detail_url = f"{self.list_url}{product.id}/"
+        self.client.force_authenticate(user=self.admin)
+
+        # the same file twice in one request is uploaded once
+        response = self.client.patch(detail_url, {
+            "images_upload[0]image": make_image_upload("a.png"),
+            "images_upload[1]image": make_image_upload("b.png"),
+        }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ingest_product_images([str(pk) for pk in product.images.values_list("pk", flat=True)])
+        first, second = product.images.order_by("created_at")
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(len(first.perceptual_hash), 16)
+        self.assertEqual(first.image.name, second.image.name)
+
+        # a later re-upload is ready immediately, without staging
+        response = self.client.patch(detail_url, {"images_upload[0]image": make_image_upload("c.png")}, format="multipart")
+        third = product.images.exclude(pk__in=[first.pk, second.pk]).get()
+        self.assertEqual(third.status, ProductImage.STATUS_READY)
+        self.assertEqual(third.staged_name, "")
+        self.assertEqual(third.image.name, first.image.name)
+
+        # blobs go once the last referencing row is deleted, after commit
+        storage = first.image.storage
+        groups = blob_groups([(third.image.name, third.variants)])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(detail_url, {"images_delete": [str(first.pk), str(second.pk)]}, format="multipart")
+        self.assertTrue(callbacks)
+        self.assertFalse(ProductImage.objects.filter(pk__in=[first.pk, second.pk]).exists())
+        delete_image_blobs(groups)
+        self.assertTrue(storage.exists(third.image.name))
+
+        self.client.delete(f"/api/product-images/{third.pk}/")
+        self.assertTrue(storage.exists(third.image.name))
+        delete_image_blobs(groups)
+        self.assertFalse(storage.exists(third.image.name))
+        self.assertFalse(any(storage.exists(v["name"]) for v in third.variants))
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp())
+    def test_sweeper_clears_orphaned_blobs(self):
+        product = Product.objects.get(slug="dell-xps-13")
+        storage = ProductImage._meta.get_field("image").storage
+        orphan = storage.save("products/images/orphan.png", make_image_upload())
+        kept = storage.save("products/images/kept.png", make_image_upload())
+        ProductImage.objects.create(product=product, image=kept)
+        OrphanedBlob.objects.create(name=orphan)
+        OrphanedBlob.objects.create(name=kept)
+
+        sweep_orphaned_blobs()
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(kept))
+        self.assertFalse(OrphanedBlob.objects.exists())
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp())
+    def test_sweeper_moves_failing_orphans_to_the_back(self):
+        storage = ProductImage._meta.get_field("image").storage
+        # a non-empty directory can't be deleted, so this orphan keeps failing
+        stuck = "products/images/stuck"
+        storage.save(f"{stuck}/inner.png", make_image_upload())
+        orphan = storage.save("products/images/orphan.png", make_image_upload())
+        OrphanedBlob.objects.create(name=stuck)
+        OrphanedBlob.objects.create(name=orphan)
+
+        sweep_orphaned_blobs(limit=1)
+        sweep_orphaned_blobs(limit=1)
+        self.assertFalse(storage.exists(orphan))
+        self.assertEqual(list(OrphanedBlob.objects.values_list("name", "attempts")), [(stuck, 1)])
+
+    @override_settings(STORAGES=LOCAL_STORAGES, PRODUCT_IMAGE_MAX_DIMENSION=500)
+    def test_uploads_are_validated_while_streaming(self):
+        self.client.force_authenticate(user=self.admin)
+        detail_url = f"{self.list_url}{Product.objects.get(slug='dell-xps-13').id}/"
+
+        def patch(upload):
+            return self.client.patch(detail_url, {"images_upload[0]image": upload}, format="multipart")
+
+        text = SimpleUploadedFile("notes.txt", b"hello", content_type="text/plain")
+        self.assertEqual(patch(text).status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        fake = SimpleUploadedFile("fake.png", b"not really a png", content_type="image/png")
+        self.assertEqual(patch(fake).status_code, status.HTTP_400_BAD_REQUEST)
+        huge = make_image_upload("huge.png", size=(600, 100))
+        self.assertEqual(patch(huge).status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(PRODUCT_UPLOAD_MAX_REQUEST_BYTES=100):
+            self.assertEqual(patch(make_image_upload()).status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(ProductImage.objects.exists())
+
+        upload = make_image_upload()
+        expected = hashlib.sha256(upload.read()).hexdigest()
+        upload.seek(0)
+        self.assertEqual(patch(upload).status_code, status.HTTP_200_OK)
+        self.assertEqual(ProductImage.objects.get().content_hash, expected)
+
+    @override_settings(STORAGES=LOCAL_STORAGES, MEDIA_URL="/media/")
+    def test_primary_image_is_denormalized_onto_product(self):
+        product = Product.objects.get(slug="dell-xps-13")
+        front = ProductImage.objects.create(product=product, image="products/images/front.jpg", is_primary=True)
+        back = ProductImage.objects.create(product=product, image="products/images/back.jpg")
+        product.refresh_primary_image()
+        self.assertEqual(product.primary_image_id, front.pk)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.patch(f"/api/product-images/{back.id}/", {"is_primary": True}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_id, back.pk)
+        self.assertEqual(product.primary_image_url, "/media/products/images/back.jpg")
+
+        response = self.client.get(self.list_url, {"search": "Dell"})
+        row = response.data["results"][0]
+        self.assertEqual(row["primary_image"], "/media/products/images/back.jpg")
+        self.assertNotIn("images", row)
+
+    def test_sparse_fieldsets_prune_response_and_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.list_url, {"fields": "id,title,price", "page_size": 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for row in response.data["results"]:
+            self.assertEqual(set(row), {"id", "title", "price"})
+        product_select = next(q["sql"] for q in ctx.captured_queries if 'FROM "products_product"' in q["sql"]
+                              and "COUNT" not in q["sql"])
+        self.assertNotIn('"description"', product_select)
+        self.assertFalse(any("products_productimage" in q["sql"] for q in ctx.captured_queries))
+
+        response = self.client.get(self.list_url, {"omit": "description", "expand": "images"})
+        row = response.data["results"][0]
+        self.assertIn("images", row)
+        self.assertNotIn("description", row)
+
+    def test_facets_count_filtered_products_in_one_query(self):
+        get_category_directory()  # category slugs resolve in memory once loaded
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"{self.list_url}facets/", {"category": "electronics"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        data = response.data
+        self.assertEqual(data["total"], 3)
+        self.assertEqual([c["slug"] for c in data["categories"]], ["electronics"])
+        self.assertEqual(data["availability"], {"in_stock": 2, "out_of_stock": 1})
+        counts = {(r["min"], r["max"]): r["count"] for r in data["price_ranges"]}
+        self.assertEqual(counts[("100", "500")], 1)
+        self.assertEqual(counts[("1000", None)], 2)
+
+        # fully held stock isn't available, in the facet or the filter
+        Product.objects.filter(slug="dell-xps-13").update(reserved=F("stock"))
+        bump_catalog_version()
+        response = self.client.get(f"{self.list_url}facets/", {"category": "electronics"})
+        self.assertEqual(response.data["availability"], {"in_stock": 1, "out_of_stock": 2})
+        response = self.client.get(self.list_url, {"category": "electronics", "in_stock": "true"})
+        self.assertEqual([p["slug"] for p in response.data["results"]], ["macbook-pro-14"])
+
+    def test_bulk_import_reports_bad_rows_without_aborting(self):
+        csv_body = (
+            "title,category,price,stock\n"
+            "USB Hub,electronics,25.00,40\n"
+            "USB Hub,electronics,27.50,10\n"
+            "Ghost Item,does-not-exist,10.00,1\n"
+            "Broken Price,fashion,abc,1\n"
+            "Canvas Tote,FASHION,15.00,\n"
+        )
+        upload = SimpleUploadedFile("catalog.csv", csv_body.encode(), content_type="text/csv")
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f"{self.list_url}import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        upload.seek(0)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(f"{self.list_url}import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rows"], 5)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual([e["row"] for e in response.data["errors"]], [4, 5])
+        self.assertIn("category", response.data["errors"][0]["errors"])
+        self.assertIn("price", response.data["errors"][1]["errors"])
+
+        slugs = set(Product.objects.filter(title="USB Hub").values_list("slug", flat=True))
+        self.assertEqual(slugs, {"usb-hub", "usb-hub-1"})
+        self.assertEqual(Product.objects.get(slug="canvas-tote").category, self.cat_fashion)
+
+    def test_export_streams_catalog_as_ndjson_and_csv(self):
+        self.client.force_authenticate(user=self.admin)
+        Product.objects.filter(slug="budget-laptop").update(is_deleted=True)
+
+        response = self.client.get(f"{self.list_url}export/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({r["category"] for r in rows}, {"electronics", "fashion"})
+
+        response = self.client.get(f"{self.list_url}export/", {"file_format": "csv"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith("id,title,slug,category"))
+        self.assertEqual(len(lines), 4)
+
+
+class SlugAllocationTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Accessories", slug="accessories")
+
+    def make(self, title, slug=""):
+        return Product.objects.create(title=title, slug=slug, category=self.category, price=10)
+
+    def test_save_appends_next_free_suffix(self):
+        self.make("iPhone case pro", slug="iphone-case-pro")
+        slugs = [self.make("iPhone case").slug for _ in range(3)]
+        self.assertEqual(slugs, ["iphone-case", "iphone-case-1", "iphone-case-2"])
+
+    def test_batch_allocation_uses_one_query(self):
+        self.make("Desk Lamp")
+        self.make("Desk Lamp")
+
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Product, ["Desk Lamp", "Desk Lamp", "Floor Lamp", "desk lamp 2"])
+
+        self.assertEqual(slugs, ["desk-lamp-2", "desk-lamp-3", "floor-lamp", "desk-lamp-2-1"])
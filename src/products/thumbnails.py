@@ -0,0 +1,109 @@
+import io
+import os
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = (160, 320, 640, 1024)
+VARIANT_FORMATS = ("webp", "jpeg")
+VARIANT_QUALITY = 82
+
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def encode(img, fmt):
+    if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    out = io.BytesIO()
+    img.save(out, format=fmt.upper(), quality=VARIANT_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def variant_specs(source_width, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS):
+    """Widths smaller than the original (or just the original if it's tiny), times formats."""
+    targets = [w for w in widths if w < source_width] or [source_width]
+    return [(w, fmt) for w in targets for fmt in formats]
+
+
+def render_variants(data, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS):
+    """
+    Decode the original once and yield (width, format, bytes) for every
+    variant, resizing once per width. Rendering is serial: ingestion runs
+    in Celery prefork children, which can't start process pools, and
+    parallelism comes from the worker's concurrency instead.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        img = ImageOps.exif_transpose(source)
+        img.load()
+    resized = None
+    for width, fmt in variant_specs(img.width, widths, formats):
+        if resized is None or resized.width != min(width, img.width):
+            resized = img
+            if img.width > width:
+                resized = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        yield resized.width, fmt, encode(resized, fmt)
+
+
+def generate_variants(image, data):
+    """
+    Create the thumbnail variants for a ProductImage from the original bytes
+    and save them next to it in the image's storage. Returns the records for
+    `ProductImage.variants`.
+    """
+    storage = image.image.storage
+    base = os.path.splitext(image.image.name)[0]
+
+    variants = []
+    for width, fmt, encoded in render_variants(data):
+        name = storage.save(f"{base}_{width}w.{EXTENSIONS[fmt]}", io.BytesIO(encoded))
+        variants.append({"width": width, "format": fmt, "name": name})
+    return variants
+
+
+def closest_variant(variants, width, fmt="jpeg"):
+    """The smallest variant at least `width` wide in `fmt`, else the widest one."""
+    candidates = sorted((v for v in variants if v["format"] == fmt), key=lambda v: v["width"])
+    if not candidates:
+        return None
+    return next((v for v in candidates if v["width"] >= width), candidates[-1])
+
+
+WIDTH_PARAM = "image_width"
+FORMAT_PARAM = "image_format"
+
+
+def requested_variant(request):
+    """
+    (width, format) from `?image_width=&image_format=`, or None when no
+    usable width was asked for. The format defaults to JPEG.
+    """
+    if request is None:
+        return None
+    try:
+        width = int(request.query_params.get(WIDTH_PARAM, ""))
+    except ValueError:
+        return None
+    if width <= 0:
+        return None
+    fmt = request.query_params.get(FORMAT_PARAM, "jpeg").lower()
+    return width, fmt if fmt in VARIANT_FORMATS else "jpeg"
+
+
+def srcset(variants, fmt="jpeg"):
+    """`srcset` attribute value for one format; `variants` must carry URLs."""
+    return ", ".join(
+        f"{v['url']} {v['width']}w"
+        for v in sorted(variants, key=lambda v: v["width"])
+        if v["format"] == fmt
+    )
+
+
+def perceptual_hash(data, size=8):
+    """64-bit difference hash (dHash) as hex; near-identical images differ in few bits."""
+    with Image.open(io.BytesIO(data)) as source:
+        img = ImageOps.exif_transpose(source).convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(img.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return f"{bits:0{size * size // 4}x}"
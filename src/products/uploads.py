@@ -0,0 +1,97 @@
+import hashlib
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageFile
+from rest_framework import status
+from rest_framework.exceptions import APIException, UnsupportedMediaType
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload is too large."
+    default_code = "upload_too_large"
+
+
+class InvalidImageUpload(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Upload is not a valid image."
+    default_code = "invalid_image"
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file to a temporary file (never to memory) and
+    validates it on the way in:
+
+    - the request is rejected up front when Content-Length exceeds
+      PRODUCT_UPLOAD_MAX_REQUEST_BYTES, and mid-stream once that many file
+      bytes have been read (covers chunked bodies without a length);
+    - each file must have an allowed image content type, stay under
+      PRODUCT_IMAGE_MAX_BYTES and have a header Pillow can read with
+      dimensions within PRODUCT_IMAGE_MAX_DIMENSION.
+
+    The SHA-256 is computed while streaming and left on the file as
+    `content_hash` so staging doesn't have to read it again.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.total_bytes = 0
+        if content_length and content_length > settings.PRODUCT_UPLOAD_MAX_REQUEST_BYTES:
+            raise UploadTooLarge()
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        if content_type not in settings.PRODUCT_IMAGE_CONTENT_TYPES:
+            raise UnsupportedMediaType(content_type)
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.header = ImageFile.Parser()
+        self.image_size = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total_bytes += len(raw_data)
+        if self.total_bytes > settings.PRODUCT_UPLOAD_MAX_REQUEST_BYTES:
+            raise UploadTooLarge()
+        if start + len(raw_data) > settings.PRODUCT_IMAGE_MAX_BYTES:
+            raise UploadTooLarge(f"{self.file_name} is larger than {settings.PRODUCT_IMAGE_MAX_BYTES} bytes.")
+
+        if self.image_size is None:
+            self.check_dimensions(raw_data)
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_dimensions(self, raw_data):
+        # Only the header is parsed; the parser is dropped once the size is known
+        try:
+            self.header.feed(raw_data)
+        except Exception:
+            raise InvalidImageUpload(f"{self.file_name} is not a valid image.")
+        if self.header.image is None:
+            return
+        self.image_size = self.header.image.size
+        self.header = None
+        width, height = self.image_size
+        limit = settings.PRODUCT_IMAGE_MAX_DIMENSION
+        if width > limit or height > limit or width * height > (Image.MAX_IMAGE_PIXELS or width * height):
+            raise InvalidImageUpload(f"{self.file_name} is larger than {limit}x{limit} pixels.")
+
+    def file_complete(self, file_size):
+        if self.image_size is None:
+            raise InvalidImageUpload(f"{self.file_name} is not a valid image.")
+        upload = super().file_complete(file_size)
+        upload.content_hash = self.digest.hexdigest()
+        upload.image_size = self.image_size
+        return upload
+
+
+class BoundedUploadMixin:
+    """
+    ViewSet mixin that parses multipart bodies of the listed actions with
+    BoundedImageUploadHandler instead of Django's default handlers.
+    """
+    bounded_upload_actions = ("create", "update", "partial_update")
+
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action in self.bounded_upload_actions:
+            request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return drf_request
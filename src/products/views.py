@@ -1,20 +1,43 @@
 from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Q
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework import permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from core.permissions import IsAdminOrReadOnly
-from utils.pagination import StandardResultsSetPagination
+from utils.pagination import CursorOrPageNumberPagination
+from utils.cache import CatalogCacheMixin, catalog_cache_key, cache_single_flight
+from utils.fieldsets import SparseQuerysetMixin
 from .models import Product, ProductImage
 from .filters import ProductFilter
+from .search import ProductSearchFilter
+from .facets import compute_product_facets
+from .importers import IMPORT_FORMATS, ProductImporter, guess_format, iter_rows
+from .exporters import EXPORT_FORMATS, CONTENT_TYPES, iter_export
+from .ingestion import blob_groups
+from .tasks import delete_image_blobs
+from .uploads import BoundedUploadMixin
 from notifications.tasks import send_new_product_notification
 from .serializers import (
     ProductSerializer, 
+    ProductListSerializer,
     ProductImageSerializer, 
+    ProductSuggestionSerializer,
     EmptySerializer
 )
 from .docs import (
     product_form_parameters,
     list_summary, list_description, list_responses,
+    suggest_summary, suggest_description, suggest_parameters, suggest_responses,
+    facets_summary, facets_description, facets_responses,
+    import_summary, import_description, import_parameters, import_responses,
+    export_summary, export_description, export_parameters, export_responses,
     retrieve_summary, retrieve_description, retrieve_responses,
     create_summary, create_description, create_responses,
     update_summary, update_description, update_responses,
@@ -22,30 +45,128 @@ from .docs import (
     delete_summary, delete_description, delete_responses
 )
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(CatalogCacheMixin, SparseQuerysetMixin, BoundedUploadMixin, ModelViewSet):
     """
     Product endpoints using multipart/form-data for uploads.
     """
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CursorOrPageNumberPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ProductSearchFilter]
     filterset_class = ProductFilter
     search_fields = ["title", "description"]
     ordering_fields = ["price", "created_at", "stock"]
-    ordering = ["-created_at"]
+    ordering = ["-created_at", "id"]
     parser_classes = [MultiPartParser, FormParser]
+    sparse_prefetch = {"images": ("images",)}
+    sparse_model_fields = {"primary_image": ("primary_image_url", "primary_image_variants")}
 
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
             return Product.objects.none()
     
         return Product.objects.filter(is_deleted=False)\
-            .select_related("category")\
-            .prefetch_related("images")
+            .defer("search_vector")\
+            .select_related("category")
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return ProductListSerializer
+        return super().get_serializer_class()
 
     def perform_destroy(self, instance):
         instance.is_deleted = True
-        instance.save()
+        instance.save(update_fields=["is_deleted", "updated_at"])
+
+    suggest_default_limit = 5
+    suggest_max_limit = 10
+
+    @action(detail=False, methods=["get"], url_path="suggest", pagination_class=None, filter_backends=[])
+    @swagger_auto_schema(
+        operation_summary=suggest_summary,
+        operation_description=suggest_description,
+        manual_parameters=suggest_parameters,
+        responses=suggest_responses,
+        tags=["Products"]
+    )
+    def suggest(self, request):
+        """
+        Prefix matches on title, served by the trigram index on
+        UPPER(title) and ranked by units sold.
+        """
+        term = request.query_params.get("q", "").strip()
+        if not term:
+            return Response([])
+
+        try:
+            limit = int(request.query_params.get("limit", self.suggest_default_limit))
+        except ValueError:
+            limit = self.suggest_default_limit
+        limit = max(1, min(limit, self.suggest_max_limit))
+
+        qs = Product.objects.filter(is_deleted=False, is_active=True)\
+            .filter(Q(title__istartswith=term) | Q(title__icontains=f" {term}"))\
+            .only("id", "title", "slug", "primary_image_url", "primary_image_variants")\
+            .order_by("-popularity", "title")[:limit]
+
+        serializer = ProductSuggestionSerializer(qs, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["get"], url_path="facets", pagination_class=None)
+    @swagger_auto_schema(
+        operation_summary=facets_summary,
+        operation_description=facets_description,
+        responses=facets_responses,
+        tags=["Products"]
+    )
+    def facets(self, request):
+        """
+        Facet counts for the same filters as the list endpoint, cached per
+        filter signature under the catalog version.
+        """
+        key = catalog_cache_key(request, self.basename, "facets")
+        data = cache_single_flight(
+            key, lambda: compute_product_facets(self.filter_queryset(self.get_queryset()))
+        )
+        return Response(data)
+
+    @action(detail=False, methods=["post"], url_path="import", permission_classes=[permissions.IsAdminUser])
+    @swagger_auto_schema(
+        operation_summary=import_summary,
+        operation_description=import_description,
+        request_body=EmptySerializer,
+        manual_parameters=import_parameters,
+        responses=import_responses,
+        tags=["Products"]
+    )
+    def bulk_import(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "This field is required."})
+
+        file_format = request.data.get("file_format") or guess_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({"file_format": f"Must be one of: {', '.join(IMPORT_FORMATS)}."})
+
+        report = ProductImporter().run(iter_rows(upload.file, file_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="export", permission_classes=[permissions.IsAdminUser])
+    @swagger_auto_schema(
+        operation_summary=export_summary,
+        operation_description=export_description,
+        manual_parameters=export_parameters,
+        responses=export_responses,
+        tags=["Products"]
+    )
+    def export(self, request):
+        file_format = request.query_params.get("file_format", "ndjson")
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError({"file_format": f"Must be one of: {', '.join(EXPORT_FORMATS)}."})
+
+        response = StreamingHttpResponse(iter_export(file_format), content_type=CONTENT_TYPES[file_format])
+        response["Content-Disposition"] = f'attachment; filename="products.{file_format}"'
+        return response
 
     @swagger_auto_schema(
         operation_summary=list_summary, 
@@ -112,7 +233,7 @@ class ProductViewSet(ModelViewSet):
         transaction.on_commit(lambda: send_new_product_notification.delay(str(product.id)))
 
 
-class ProductImageViewSet(ModelViewSet):
+class ProductImageViewSet(BoundedUploadMixin, ModelViewSet):
     queryset = ProductImage.objects.select_related("product").all()
     serializer_class = ProductImageSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -130,19 +251,32 @@ class ProductImageViewSet(ModelViewSet):
         product_id = serializer.validated_data.get("product_id") or self.request.data.get("product_id")
         
         with transaction.atomic():
-            instance = serializer.save()
+            # Unset first: the partial unique constraint allows one primary per product
             if is_primary:
-                self._unset_other_primaries(product_id, instance.pk)
+                self._unset_other_primaries(product_id, None)
+            instance = serializer.save(product_id=product_id)
+            instance.product.refresh_primary_image()
         return instance
 
     def perform_update(self, serializer):
         is_primary = serializer.validated_data.get("is_primary", None)
         with transaction.atomic():
-            instance = serializer.save()
             if is_primary:
-                self._unset_other_primaries(instance.product_id, instance.pk)
+                self._unset_other_primaries(serializer.instance.product_id, serializer.instance.pk)
+            instance = serializer.save()
+            instance.product.refresh_primary_image()
         return instance
 
+    def perform_destroy(self, instance):
+        product = instance.product
+        groups = blob_groups([(instance.image.name, instance.variants)])
+        staged = [instance.staged_name] if instance.staged_name else []
+        with transaction.atomic():
+            instance.delete()
+            product.refresh_primary_image()
+            if groups or staged:
+                transaction.on_commit(lambda: delete_image_blobs.delay(groups, staged))
+
     def _unset_other_primaries(self, product_id, current_image_pk):
         ProductImage.objects.filter(product_id=product_id)\
             .exclude(pk=current_image_pk)\
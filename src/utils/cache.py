@@ -0,0 +1,146 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def get_version_stamp(key):
+    """
+    Current value of a version stamp kept in the cache. Keys built from it
+    are invalidated all at once by bumping it.
+    """
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted key never resurrects old entries.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _incr_version_stamp(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_version_stamp(key):
+    """
+    Bump immediately and again after the surrounding transaction commits,
+    so a reader that re-caches uncommitted state in between doesn't keep it.
+    """
+    _incr_version_stamp(key)
+    transaction.on_commit(lambda: _incr_version_stamp(key))
+
+
+def get_catalog_version():
+    """
+    Current catalog version stamp. Every cached catalog response is keyed
+    under it, so bumping the version invalidates all of them at once.
+    """
+    return get_version_stamp(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate cached catalog reads (see bump_version_stamp)."""
+    bump_version_stamp(CATALOG_VERSION_KEY)
+
+
+def catalog_cache_key(request, namespace, *parts):
+    """
+    Build a key from the catalog version, a namespace, any extra parts and
+    the normalized query string (sorted keys and values, blanks dropped).
+    """
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ""
+    )
+    raw = "|".join([
+        request.get_host(),
+        namespace,
+        *[str(part) for part in parts],
+        "&".join(f"{key}={value}" for key, value in params),
+    ])
+    digest = hashlib.sha256(raw.encode()).hexdigest()
+    return f"catalog:{get_catalog_version()}:{namespace}:{digest}"
+
+
+def cache_single_flight(key, compute, timeout=None, cacheable=None):
+    """
+    Return the cached value for `key`, computing it with `compute()` on a miss.
+
+    Only one caller at a time computes a missing key: the others wait briefly
+    for the value to appear instead of stampeding the database right after an
+    invalidation. If the value still isn't there after
+    CATALOG_CACHE_LOCK_WAIT seconds they compute it themselves.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    timeout = settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout
+    lock_key = f"{key}:lock"
+    lock_timeout = settings.CATALOG_CACHE_LOCK_TIMEOUT
+
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            value = compute()
+            if cacheable is None or cacheable(value):
+                cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    return compute()
+
+
+class CatalogCacheMixin:
+    """
+    Serve anonymous `list`/`retrieve` responses from the versioned catalog
+    cache. Must come before the DRF viewset class in the bases.
+    """
+    catalog_cache_actions = ("list", "retrieve")
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def is_catalog_cacheable(self, request):
+        return (
+            self.action in self.catalog_cache_actions
+            and request.method == "GET"
+            and not request.user.is_authenticated
+        )
+
+    def catalog_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_catalog_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = catalog_cache_key(
+            request, self.basename, self.action, *(f"{k}={v}" for k, v in sorted(kwargs.items()))
+        )
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            return response.status_code, response.data
+
+        status_code, data = cache_single_flight(
+            key, compute, cacheable=lambda value: value[0] == status.HTTP_200_OK
+        )
+        return Response(data, status=status_code)
@@ -0,0 +1,102 @@
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+EXPAND_PARAM = "expand"
+
+
+def _param_list(request, name):
+    raw = request.query_params.get(name, "")
+    return {part.strip() for part in raw.split(",") if part.strip()}
+
+
+def wants_sparse_fieldset(request):
+    return bool(_param_list(request, FIELDS_PARAM) or _param_list(request, OMIT_PARAM))
+
+
+def wants_expansion(request, name):
+    return name in _param_list(request, EXPAND_PARAM)
+
+
+def select_fields(request, available, expandable=()):
+    """
+    Names from `available` that a response should contain.
+
+    `?fields=` whitelists, `?omit=` blacklists, and fields listed in
+    `expandable` are left out unless named in `?expand=` or `?fields=`.
+    """
+    fields = _param_list(request, FIELDS_PARAM)
+    omit = _param_list(request, OMIT_PARAM)
+    expand = _param_list(request, EXPAND_PARAM)
+
+    if fields:
+        selected = [name for name in available if name in fields]
+    else:
+        selected = [name for name in available if name not in expandable or name in expand]
+    return [name for name in selected if name not in omit]
+
+
+class SparseFieldsetsMixin:
+    """
+    Serializer mixin that drops fields the client didn't ask for on GET
+    requests. Heavy fields can be listed in `Meta.expandable_fields` to be
+    left out unless requested with `?expand=`.
+
+    Only the top-level serializer is pruned; nested serializers are built
+    without the request context and keep all their fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        expandable = getattr(self.Meta, "expandable_fields", ())
+        keep = set(select_fields(request, list(self.fields), expandable))
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+class SparseQuerysetMixin:
+    """
+    View mixin that narrows the queryset to what the sparse serializer will
+    render:
+
+    - `sparse_prefetch` maps a serializer field to the prefetch lookups it
+      needs; lookups are only added when the field is rendered.
+    - When `?fields=`/`?omit=` is given, the query is narrowed with `.only()`
+      to the model fields backing the rendered serializer fields, plus
+      `sparse_model_fields` for method fields and `sparse_required_fields`.
+    """
+    sparse_prefetch = {}
+    sparse_model_fields = {}
+    sparse_required_fields = ("id", "created_at")
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return self.apply_sparse_fieldset(queryset)
+
+    def apply_sparse_fieldset(self, queryset):
+        fields = self.get_serializer().fields
+
+        for name, lookups in self.sparse_prefetch.items():
+            if name in fields:
+                queryset = queryset.prefetch_related(*lookups)
+
+        if not wants_sparse_fieldset(self.request):
+            return queryset
+
+        concrete = {f.name for f in queryset.model._meta.concrete_fields}
+        only = set(self.sparse_required_fields)
+        for name, field in fields.items():
+            if field.source in concrete:
+                only.add(field.source)
+            only.update(self.sparse_model_fields.get(name, ()))
+
+        # select_related on a deferred FK is an error; the serializers here
+        # render FKs as primary keys so the joins aren't needed anyway.
+        return queryset.select_related(None).only(*only)
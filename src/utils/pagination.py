@@ -1,6 +1,199 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core import signing
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (
+    PageNumberPagination,
+    CursorPagination,
+    Cursor,
+    _positive_int,
+    _reverse_ordering,
+)
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = "page_size"
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class SignedCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (-created_at, id).
+
+    The position is the row's value for every ordering field, with `id`
+    appended as a tiebreaker when the ordering doesn't end on a unique
+    field, so rows sharing a timestamp are seeked past rather than skipped
+    with OFFSET.
+
+    Cursor tokens are signed with SECRET_KEY so clients can't forge
+    positions or offsets; a tampered token is treated as an invalid cursor.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "id")
+    unique_field = "id"
+    cursor_salt = "utils.pagination.cursor"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if not any(field.lstrip("-") in (self.unique_field, "pk") for field in ordering):
+            ordering += (self.unique_field,)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            name = field.lstrip("-")
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            position.append(str(value))
+        return position
+
+    def seek(self, ordering, position):
+        """
+        Rows strictly after `position` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ..., per field direction.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset, seeking on the full position
+        # instead of the first ordering field alone
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            if not isinstance(current_position, list) or len(current_position) != len(ordering):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                queryset = queryset.filter(self.seek(ordering, current_position))
+            except (DjangoValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def encode_cursor(self, cursor):
+        # the ordering is signed in too: a position only means something
+        # for the ordering it was taken from
+        tokens = {"s": list(self.ordering)}
+        if cursor.offset != 0:
+            tokens["o"] = cursor.offset
+        if cursor.reverse:
+            tokens["r"] = 1
+        if cursor.position is not None:
+            tokens["p"] = cursor.position
+
+        encoded = signing.dumps(tokens, salt=self.cursor_salt, compress=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = signing.loads(encoded, salt=self.cursor_salt)
+            offset = _positive_int(tokens.get("o", 0), cutoff=self.offset_cutoff)
+            reverse = bool(tokens.get("r", 0))
+            position = tokens.get("p")
+            ordering = tokens.get("s")
+        except (signing.BadSignature, AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position is not None and ordering != list(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=offset, reverse=reverse, position=position)
+
+
+class CursorOrPageNumberPagination(StandardResultsSetPagination):
+    """
+    Page-number pagination by default. Requests that send `?pagination=cursor`
+    (or follow a `cursor` link) are paginated with `SignedCursorPagination`
+    instead, which skips the COUNT(*) and seeks rather than using OFFSET.
+
+    Cursors need an ordering they can seek on, so a `search` without an
+    explicit `ordering` (which would be ranked by relevance) is rejected in
+    cursor mode rather than silently losing its rank order.
+    """
+    mode_query_param = "pagination"
+    cursor_pagination_class = SignedCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def uses_cursor(self, request):
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or cursor_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_cursor(request):
+            if request.query_params.get(api_settings.SEARCH_PARAM) and not request.query_params.get(
+                api_settings.ORDERING_PARAM
+            ):
+                raise ValidationError({
+                    self.mode_query_param: "Cursor pagination can't follow search relevance; "
+                    "pass `ordering` or use page numbers."
+                })
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)